@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.schemas.user import UserCreate, UserLogin, UserOut
 from app.services.user_service import create_user, get_user_by_email
 from app.core.security import verify_password, create_access_token, create_refresh_token, verify_token
 from fastapi.security import OAuth2PasswordBearer
 from database.models.user import User
-from database.database import get_db
+from database.database import get_db, AsyncSessionLocal
+from app.core.user_cache import user_cache
 
 router = APIRouter()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     payload = verify_token(token)
     if payload is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials")
@@ -21,10 +24,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if email is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = user_cache.get(email)
+    if user is not None:
+        return user
+
+    # an own short session instead of a request scoped one, which would stay open
+    # (idle in transaction) until a streamed response such as /jobs/{id}/events ends
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    user_cache.set(email, user)
     return user
 
 @router.get("/me", response_model=UserOut)
@@ -35,7 +47,9 @@ def read_current_user(current_user: User = Depends(get_current_user)):
 def register(user_in: UserCreate, db: Session = Depends(get_db)):
     if get_user_by_email(db, user_in.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    return create_user(db, user_in)
+    user = create_user(db, user_in)
+    user_cache.invalidate(user.email)
+    return user
 
 
 @router.post("/login")
@@ -74,6 +88,9 @@ def refresh_token(request: Request):
 
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(response: Response, token: str | None = Depends(optional_oauth2_scheme)):
+    payload = verify_token(token) if token else None
+    if payload and payload.get("sub"):
+        user_cache.invalidate(payload["sub"])
     response.delete_cookie(key="refresh_token")
     return {"message": "Logged out successfully"}
\ No newline at end of file
@@ -1,19 +1,50 @@
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from database.database import get_db
+from database.database import get_db, SessionLocal
 from app.api.auth import get_current_user
 from database.models.user import User
 from database.models.file import File
 from app.services.file_service import (
-    generate_main_encoded_raport,
-    generate_main_detailed_raport,
-    generate_partial_report_md,
-    generate_partial_report_json
+    stream_main_encoded_raport,
+    stream_main_detailed_raport,
+    get_report_dir,
+    get_job_report_version,
+    get_versioned_report_path,
+    get_partial_report,
 )
 import os
 router = APIRouter()
-JOB_FILES_DIR = "/app/jobs_files"
+
+def get_csv_report(report, job_id: int, filename: str):
+    # the stream owns its session and closes it once the body is sent,
+    # the endpoints keep no request scoped session open while streaming
+    db = SessionLocal()
+    # reports pre-generated for the current job content are served as they are
+    output_path = get_versioned_report_path(get_report_dir(job_id), filename, get_job_report_version(db, job_id))
+    if os.path.exists(output_path):
+        db.close()
+        return FileResponse(output_path, media_type="text/csv", filename=filename)
+
+    lines = report(db, job_id)
+    try:
+        header = next(lines)
+    except ValueError as e:
+        db.close()
+        raise HTTPException(status_code=404, detail=str(e))
+
+    def body():
+        try:
+            yield header
+            yield from lines
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/{file_id}")
 def get_pdf(file_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -24,43 +55,21 @@ def get_pdf(file_id: int, db: Session = Depends(get_db), current_user: User = De
     return FileResponse(output_path, media_type="application/pdf", filename=os.path.basename(output_path))
 
 @router.get("/main_encoded_raport/{job_id}")
-def get_main_encoded_raport(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    dir = "demo" if job_id == 1 else job_id
-    output_dir = os.path.join(JOB_FILES_DIR, str(dir), "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, "raport_encoded.csv")
-    if not os.path.exists(output_path):
-        output_path = generate_main_encoded_raport(db, job_id, output_path)
-    return FileResponse(output_path, media_type="text/csv", filename=os.path.basename(output_path))
+def get_main_encoded_raport(job_id: int, current_user: User = Depends(get_current_user)):
+    return get_csv_report(stream_main_encoded_raport, job_id, "raport_encoded.csv")
 
 @router.get("/main_detailed_raport/{job_id}")
-def get_main_detailed_raport(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    dir = "demo" if job_id == 1 else job_id
-    output_dir = os.path.join(JOB_FILES_DIR, str(dir), "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, "raport_detailed.csv")
-    if not os.path.exists(output_path):
-        output_path = generate_main_detailed_raport(db, job_id, output_path)
-    return FileResponse(output_path, media_type="text/csv", filename=os.path.basename(output_path))
+def get_main_detailed_raport(job_id: int, current_user: User = Depends(get_current_user)):
+    return get_csv_report(stream_main_detailed_raport, job_id, "raport_detailed.csv")
 
 @router.get("/partial_report/{file_id}/md")
 def get_partial_report_md(file_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     file = db.query(File).filter(File.id == file_id).first()
-    dir = "demo" if file.job_id == 1 else file.job_id
-    output_dir = os.path.join(JOB_FILES_DIR, str(dir), "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"{os.path.splitext(file.filename)[0]}_raport.md")
-    if not os.path.exists(output_path):
-        output_path = generate_partial_report_md(db, file.job_id, file.id, file.filename,  output_path)
-    return FileResponse(output_path, media_type="text/markdown", filename=os.path.basename(output_path))
+    output_path = get_partial_report(db, file, "md")
+    return FileResponse(output_path, media_type="text/markdown", filename=f"{os.path.splitext(file.filename)[0]}_raport.md")
 
 @router.get("/partial_report/{file_id}/json")
-def get_partial_report_md(file_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_partial_report_json(file_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     file = db.query(File).filter(File.id == file_id).first()
-    dir = "demo" if file.job_id == 1 else file.job_id
-    output_dir = os.path.join(JOB_FILES_DIR, str(dir), "output")
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"{os.path.splitext(file.filename)[0]}_raport.json")
-    if not os.path.exists(output_path):
-        output_path = generate_partial_report_json(db, file.job_id, file.id, file.filename,  output_path)
-    return FileResponse(output_path, media_type="application/json", filename=os.path.basename(output_path))
\ No newline at end of file
+    output_path = get_partial_report(db, file, "json")
+    return FileResponse(output_path, media_type="application/json", filename=f"{os.path.splitext(file.filename)[0]}_raport.json")
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, Request
+from fastapi.responses import StreamingResponse
 from typing import List
 from sqlalchemy.orm import Session
-from app.schemas.jobs import JobOut, JobDetail, JobStatus
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.jobs import JobOut, JobDetail, JobStatus, JobMetrics
+from app.schemas.answer import JobAnswers
+from app.services.answer_service import get_job_answers_since, get_job_metrics
 from database.models.user import User
 from database.models.job import Job
-from app.services.jobs_service import get_status_job_by_id, get_user_jobs, get_job_detail_demo, get_job_detail_by_id, create_job_with_files, stop_job_by_id
-from database.database import get_db
+from app.services.jobs_service import get_status_job_by_id, get_user_jobs, get_job_detail_demo, get_job_detail_by_id, create_job_with_files, stop_job_by_id, check_job_access, stream_job_events
+from database.database import get_db, get_async_db, AsyncSessionLocal
 from app.api.auth import get_current_user
 
 router = APIRouter()
@@ -19,26 +23,45 @@ def get_demo_detail(db: Session = Depends(get_db), current_user: User = Depends(
     return get_job_detail_demo(db, job_id=1)
 
 @router.get("/{job_id}", response_model=JobDetail)
-def get_job_detail(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return get_job_detail_by_id(db, current_user, job_id)
+async def get_job_detail(job_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_job_detail_by_id(db, current_user, job_id)
 
 @router.get("/demo/status", response_model=JobStatus)
-def get_status_job(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return get_status_job_by_id(db, current_user, job_id=1)
+async def get_status_job(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_status_job_by_id(db, current_user, job_id=1)
 
 @router.get("/{job_id}/status", response_model=JobStatus)
-def get_status_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return get_status_job_by_id(db, current_user, job_id)
+async def get_status_job(job_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_status_job_by_id(db, current_user, job_id)
+
+@router.get("/{job_id}/answers", response_model=JobAnswers)
+async def get_job_answers(job_id: int, since: str | None = None, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_job_answers_since(db, current_user, job_id, since)
+
+@router.get("/{job_id}/metrics", response_model=JobMetrics)
+async def get_job_evaluation_metrics(job_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    return await get_job_metrics(db, current_user, job_id)
+
+@router.get("/{job_id}/events")
+async def get_job_events(job_id: int, request: Request, current_user: User = Depends(get_current_user)):
+    # request scoped sessions are closed only after the stream ends, the check uses its own short session
+    async with AsyncSessionLocal() as db:
+        await check_job_access(db, current_user, job_id)
+    return StreamingResponse(
+        stream_job_events(request, job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("")
-def create_job(
+async def create_job(
     name: str = Form(...),
     questions: List[str] = Form(...),
     files: List[UploadFile] = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return create_job_with_files(db, current_user, name, questions, files)
+    return await create_job_with_files(db, current_user, name, questions, files)
 
 @router.post("/{job_id}/stop")
 def stop_job(job_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
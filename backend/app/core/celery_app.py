@@ -2,12 +2,16 @@ from celery import Celery
 
 print("Starting Celery app...")
 
-celery_app = Celery("app")
+# The task modules pull in the whole mies_rag stack, they are imported by the worker only.
+# The API enqueues tasks by name through app.core.dispatch.
+celery_app = Celery(
+    "app",
+    include=[
+        "app.tasks.process_job",
+        "app.tasks.generate_reports",
+        "app.tasks.evaluate_answers",
+    ],
+)
 celery_app.config_from_object("app.core.config_celary")
-celery_app.autodiscover_tasks(["app.tasks"])
-
-import app.tasks.process_job
-
-print("Registered tasks:", celery_app.tasks.keys())
 
 print("Celery app is ready!")
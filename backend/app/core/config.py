@@ -4,5 +4,8 @@ class Settings:
     SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+    REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+    USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
 
 settings = Settings()
\ No newline at end of file
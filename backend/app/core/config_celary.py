@@ -6,3 +6,13 @@ result_serializer = "json"
 accept_content = ["json"]
 timezone = "Europe/Warsaw"
 enable_utc = True
+
+# Job tasks are long running, don't let a worker reserve tasks it can't start yet
+# so that idle workers pick them up instead
+worker_prefetch_multiplier = 1
+
+# Evaluation runs on its own queue, consumed by the evaluation worker (docker-compose),
+# so it never delays answering other jobs
+task_routes = {
+    "app.tasks.evaluate_answers.evaluate_answers": {"queue": "evaluation"},
+}
@@ -0,0 +1,11 @@
+from app.core.celery_app import celery_app
+
+PROCESS_JOB_TASK = "app.tasks.process_job.process_job"
+
+
+def enqueue_process_job(job_id: int):
+    '''
+    Sends the job to the workers by task name, so the API never imports the task modules
+    '''
+    return celery_app.send_task(PROCESS_JOB_TASK, args=[job_id])
+
@@ -0,0 +1,81 @@
+import json
+import redis
+import redis.asyncio as aioredis
+from app.core.config import settings
+
+_redis = None
+
+
+def job_channel(job_id: int) -> str:
+    return f"jobs:{job_id}:events"
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
+
+
+def answer_event(answer_id: int, status: str, answer_encoded: str = "") -> dict:
+    return {"type": "answer", "id": answer_id, "status": status, "answer_encoded": answer_encoded or ""}
+
+
+def job_event(status: str) -> dict:
+    return {"type": "job", "status": status}
+
+
+def publish_job_events(job_id: int, events: list[dict]):
+    '''
+    Publishes job progress to the subscribers of /jobs/{job_id}/events.
+    Progress events are best effort, a broker failure never fails the job.
+    '''
+    if not events:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for event in events:
+            pipe.publish(job_channel(job_id), json.dumps(event))
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Publishing events of job {job_id} failed: {e!r}")
+
+
+def llm_cache_key(job_id: int) -> str:
+    return f"jobs:{job_id}:llm_cache"
+
+
+def record_llm_cache_stats(job_id: int, stats: dict):
+    '''
+    Adds the LLM cache hits/misses of one task to the totals of the job.
+    '''
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hincrby(llm_cache_key(job_id), "hits", stats["hits"])
+        pipe.hincrby(llm_cache_key(job_id), "misses", stats["misses"])
+        pipe.expire(llm_cache_key(job_id), 7 * 24 * 60 * 60)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Recording LLM cache stats of job {job_id} failed: {e!r}")
+
+
+def get_llm_cache_stats(job_id: int) -> dict:
+    try:
+        totals = get_redis().hgetall(llm_cache_key(job_id))
+    except redis.RedisError:
+        totals = {}
+    hits = int(totals.get(b"hits", 0))
+    misses = int(totals.get(b"misses", 0))
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def subscribe_job_events(job_id: int):
+    client = aioredis.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(job_channel(job_id))
+    return client, pubsub
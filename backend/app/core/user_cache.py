@@ -0,0 +1,46 @@
+import time
+import threading
+from collections import OrderedDict
+from database.models.user import User
+from app.core.config import settings
+
+
+class UserCache:
+    '''
+    Authenticated users by token subject, so a request does not read the users table.
+    Entries live for ttl seconds, the least recently used are evicted above maxsize.
+    '''
+    def __init__(self, ttl: int, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, subject: str) -> User | None:
+        with self.lock:
+            entry = self.entries.get(subject)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self.entries[subject]
+                return None
+            self.entries.move_to_end(subject)
+        # a fresh detached copy per request, handlers never share an instance
+        return User(id=user.id, email=user.email, name=user.name)
+
+    def set(self, subject: str, user: User):
+        # the password hash is never cached
+        copy = User(id=user.id, email=user.email, name=user.name)
+        with self.lock:
+            self.entries[subject] = (time.monotonic() + self.ttl, copy)
+            self.entries.move_to_end(subject)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        with self.lock:
+            self.entries.pop(subject, None)
+
+
+user_cache = UserCache(settings.USER_CACHE_TTL, settings.USER_CACHE_SIZE)
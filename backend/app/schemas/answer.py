@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 
 class AnswerOut(BaseModel):
     answer_encoded: Optional[str]
@@ -13,4 +13,9 @@ class AnswerDetail(BaseModel):
     answer_text: str
     answer_contexts: List[dict] = []
     answer_conversation: List[dict] = []
-    evaluation: Dict = {}
\ No newline at end of file
+    evaluation: Dict = {}
+
+class JobAnswers(BaseModel):
+    cursor: Optional[str]
+    # (answer_id, status, answer_encoded)
+    answers: List[Tuple[int, str, str]]
\ No newline at end of file
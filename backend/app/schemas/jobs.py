@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict
 from datetime import datetime
 
 class JobOut(BaseModel):
@@ -30,4 +30,15 @@ class JobDetail(BaseModel):
     answers: List[Answer]
 
 class JobStatus(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+class MetricSummary(BaseModel):
+    count: int
+    mean: Optional[float]
+    ci_low: Optional[float]
+    ci_high: Optional[float]
+
+class JobMetrics(BaseModel):
+    answers: int
+    evaluated: int
+    metrics: Dict[str, MetricSummary]
@@ -1,17 +1,26 @@
+import math
+from sqlalchemy import select, func, case, Float
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from datetime import datetime, timedelta, timezone
 from database.models.answer import Answer
 from database.models.user import User
 from database.models.job import Job
 from database.models.question import Question
 from database.models.file import File
+from app.services.jobs_service import check_job_access
 
 
-def get_answer_code(db: Session, user: User, answer_id: int):
+async def get_answer_code(db: AsyncSession, user: User, answer_id: int):
     user_id = 1 if answer_id <= 50 else user.id
-    answer = db.query(Answer).join(Job).filter(
-        Answer.id == answer_id,
-        Job.user_id == user_id
-    ).first()
+    result = await db.execute(
+        select(Answer.status, Answer.answer_encoded).join(Job).where(
+            Answer.id == answer_id,
+            Job.user_id == user_id
+        )
+    )
+    answer = result.first()
 
     if not answer:
         return {
@@ -54,4 +63,65 @@ def get_answer_detail_by_id(db: Session, user: User, answer_id: int):
         "answer_contexts": answer.answer_contexts,
         "answer_conversation": answer.answer_conversation,
         "evaluation": answer.evaluation,
-    }
\ No newline at end of file
+    }
+
+# Answers written by a transaction that committed late may carry an older
+# updated_at than the cursor, so every poll re-reads this window.
+CURSOR_OVERLAP = timedelta(seconds=5)
+
+async def get_job_answers_since(db: AsyncSession, user: User, job_id: int, since: str | None):
+    await check_job_access(db, user, job_id)
+
+    query = select(Answer.id, Answer.status, Answer.answer_encoded, Answer.updated_at).where(Answer.job_id == job_id)
+    if since:
+        try:
+            cursor = datetime.fromisoformat(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # updated_at is a naive UTC timestamp, offset-aware cursors are converted to match it
+        if cursor.tzinfo is not None:
+            cursor = cursor.astimezone(timezone.utc).replace(tzinfo=None)
+        query = query.where(Answer.updated_at > cursor - CURSOR_OVERLAP)
+
+    answers = (await db.execute(query)).all()
+    timestamps = [a.updated_at for a in answers if a.updated_at]
+    return {
+        "cursor": max(timestamps).isoformat() if timestamps else since,
+        "answers": [
+            (a.id, a.status, (a.answer_encoded or "") if a.status == "done" else "")
+            for a in answers
+        ],
+    }
+
+
+RAGAS_METRICS = ["faithfulness", "llm_context_precision_without_reference", "answer_relevancy"]
+CI_Z = 1.96
+
+async def get_job_metrics(db: AsyncSession, user: User, job_id: int):
+    '''
+    Mean and 95% confidence interval of the RAGAS scores of a job, aggregated by the database
+    '''
+    await check_job_access(db, user, job_id)
+
+    columns = [
+        func.count(Answer.id).filter(Answer.status == "done"),
+        func.count(Answer.id).filter(func.jsonb_typeof(Answer.evaluation["ragas"]) == "object"),
+    ]
+    for metric in RAGAS_METRICS:
+        # scores a metric failed to compute are null and left out
+        value = Answer.evaluation["ragas"][metric]
+        score = case((func.jsonb_typeof(value) == "number", value.astext.cast(Float)))
+        columns += [func.count(score), func.avg(score), func.stddev_samp(score)]
+    row = (await db.execute(select(*columns).where(Answer.job_id == job_id))).one()
+
+    metrics = {}
+    for i, metric in enumerate(RAGAS_METRICS):
+        count, mean, stddev = row[2 + 3 * i: 5 + 3 * i]
+        margin = CI_Z * stddev / math.sqrt(count) if stddev is not None else None
+        metrics[metric] = {
+            "count": count,
+            "mean": mean,
+            "ci_low": mean - margin if margin is not None else None,
+            "ci_high": mean + margin if margin is not None else None,
+        }
+    return {"answers": row[0], "evaluated": row[1], "metrics": metrics}
@@ -1,52 +1,87 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Session
 from database.models.answer import Answer
 from database.models.job import Job
+from database.models.question import Question
+from database.models.file import File
+from itertools import groupby
 import csv
 import json
+import os
+import re
+import tempfile
 
-def generate_main_encoded_raport(db: Session, job_id: int, output_path: str):
-    job = db.query(Job).filter(Job.id == job_id).first()
+JOB_FILES_DIR = "/app/jobs_files"
+
+REPORT_BATCH_SIZE = 1000
+
+
+class CsvEcho:
+    '''
+    File-like object for csv.writer returning the formatted line instead of storing it
+    '''
+    def write(self, value):
+        return value
+
+
+def iter_answers_by_file(answers, files):
+    '''
+    Pairs every file with its answers ({question_id: answer}).
+    Both streams must be ordered by file id.
+    '''
+    groups = groupby(answers, key=lambda a: a.file_id)
+    current = next(groups, None)
+    for file in files:
+        while current and current[0] < file.id:
+            current = next(groups, None)
+        file_answers = {}
+        if current and current[0] == file.id:
+            file_answers = {a.question_id: a for a in current[1]}
+            current = next(groups, None)
+        yield file, file_answers
+
+
+def get_report_questions_and_files(db: Session, job_id: int):
+    job = db.query(Job.id).filter(Job.id == job_id).first()
     if not job:
         raise ValueError(f"Job with id {job_id} not found.")
 
-    questions = job.questions
-    files = job.files
+    questions = db.query(Question.id, Question.text, Question.possible_options).filter(
+        Question.job_id == job_id
+    ).order_by(Question.id).all()
+    files = db.query(File.id, File.filename).filter(File.job_id == job_id).order_by(File.id).all()
+    return questions, files
 
-    header = [""] + [
+
+def stream_main_encoded_raport(db: Session, job_id: int):
+    questions, files = get_report_questions_and_files(db, job_id)
+    writer = csv.writer(CsvEcho())
+
+    yield writer.writerow([""] + [
         f"{q.text}\n{q.possible_options}" if q.possible_options else q.text
         for q in questions
-    ]
+    ])
 
-    answers = db.query(Answer).filter(Answer.job_id == job_id).all()
-    answer_map = {(a.file_id, a.question_id): a for a in answers}
+    # only the needed columns, fetched in batches through a server-side cursor
+    answers = db.query(Answer.file_id, Answer.question_id, Answer.answer_encoded).filter(
+        Answer.job_id == job_id
+    ).order_by(Answer.file_id).yield_per(REPORT_BATCH_SIZE)
 
-    data_rows = []
-    for file in files:
+    for file, answer_map in iter_answers_by_file(answers, files):
         row = [file.filename]
         for question in questions:
-            key = (file.id, question.id)
-            answer = answer_map.get(key)
+            answer = answer_map.get(question.id)
             row.append(answer.answer_encoded if answer and answer.answer_encoded else "")
-        data_rows.append(row)
+        yield writer.writerow(row)
 
-    with open(output_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(header)
-        writer.writerows(data_rows)
-
-    return output_path
 
+def stream_main_detailed_raport(db: Session, job_id: int):
+    questions, files = get_report_questions_and_files(db, job_id)
+    writer = csv.writer(CsvEcho())
 
-def generate_main_detailed_raport(db: Session, job_id: int, output_path: str):
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        raise ValueError(f"Job with id {job_id} not found.")
-
-    questions = job.questions
-    files = job.files
-
-    header_line_1 = [""] + [q.text for q in questions for _ in range(3)]
-    header_line_2 = [""] + [
+    yield writer.writerow([""] + [q.text for q in questions for _ in range(3)])
+    yield writer.writerow([""] + [
         item
         for q in questions
         for item in (
@@ -54,37 +89,47 @@ def generate_main_detailed_raport(db: Session, job_id: int, output_path: str):
             "[LLM answer]",
             f"[kod]:\n{q.possible_options}" if q.possible_options else "[kod]"
         )
-    ]
-    answers = db.query(Answer).filter(Answer.job_id == job_id).all()
-    answer_map = {(a.file_id, a.question_id): a for a in answers}
+    ])
 
-    data_rows = []
-    for file in files:
+    # only the context texts are taken out of the JSONB column, the other heavy columns are skipped
+    contexts = func.jsonb_path_query_array(Answer.answer_contexts, "$[*].context", type_=JSONB)
+    answers = db.query(
+        Answer.file_id, Answer.question_id, Answer.answer_encoded, Answer.answer_text, contexts.label("contexts")
+    ).filter(
+        Answer.job_id == job_id
+    ).order_by(Answer.file_id).yield_per(REPORT_BATCH_SIZE)
+
+    for file, answer_map in iter_answers_by_file(answers, files):
         data_row = [file.filename]
         for question in questions:
-            key = (file.id, question.id)
-            answer = answer_map.get(key)
+            answer = answer_map.get(question.id)
 
             context = answer_text = answer_encoded = ""
             if answer:
                 answer_encoded = answer.answer_encoded or ""
                 answer_text = answer.answer_text or ""
                 context = ""
-                for i, c in enumerate(answer.answer_contexts or []):
-                    context += f"{i+1}.  {c.get('context', '')}\n"
+                for i, c in enumerate(answer.contexts or []):
+                    context += f"{i+1}.  {c}\n"
 
             data_row.extend([context.strip(), answer_text, answer_encoded])
-        data_rows.append(data_row)
+        yield writer.writerow(data_row)
 
-    with open(output_path, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file)
-        writer.writerow(header_line_1)
-        writer.writerow(header_line_2)
-        writer.writerows(data_rows)
 
+def write_report(lines, output_path: str):
+    with open(output_path, mode='w', newline='', encoding='utf-8') as file:
+        file.writelines(lines)
     return output_path
 
 
+def generate_main_encoded_raport(db: Session, job_id: int, output_path: str):
+    return write_report(stream_main_encoded_raport(db, job_id), output_path)
+
+
+def generate_main_detailed_raport(db: Session, job_id: int, output_path: str):
+    return write_report(stream_main_detailed_raport(db, job_id), output_path)
+
+
 def generate_partial_report_md(db: Session, job_id: int, file_id:int, filename: str, output_path: str):
     job = db.query(Job).filter(Job.id == job_id).first()
 
@@ -230,4 +275,94 @@ def generate_partial_report_json(db: Session, job_id: int, file_id: int, filenam
 
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(report, f, indent=2, ensure_ascii=False)
-    return output_path
\ No newline at end of file
+    return output_path
+
+
+def get_report_dir(job_id: int):
+    dir = "demo" if job_id == 1 else job_id
+    output_dir = os.path.join(JOB_FILES_DIR, str(dir), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def format_report_version(latest):
+    return latest.strftime("%Y%m%d%H%M%S%f") if latest else "0"
+
+
+def get_job_report_version(db: Session, job_id: int):
+    '''
+    Content version of a job: the time of the last answer change
+    '''
+    latest = db.query(func.max(Answer.updated_at)).filter(Answer.job_id == job_id).scalar()
+    return format_report_version(latest)
+
+
+def get_file_report_version(db: Session, file_id: int):
+    latest = db.query(func.max(Answer.updated_at)).filter(Answer.file_id == file_id).scalar()
+    return format_report_version(latest)
+
+
+def get_versioned_report_path(output_dir: str, report_name: str, version: str):
+    base, ext = os.path.splitext(report_name)
+    return os.path.join(output_dir, f"{base}_{version}{ext}")
+
+
+def store_report(generate, output_path: str, report_name: str, *args):
+    '''
+    Writes a report atomically and removes the older versions of the same report
+    '''
+    output_dir = os.path.dirname(output_path)
+    # a unique temp file per call, the same report can be requested by several threads at once
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix=f"{os.path.basename(output_path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        generate(*args, tmp_path)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    base, ext = os.path.splitext(report_name)
+    old_version = re.compile(re.escape(base) + r"_\d+" + re.escape(ext) + "$")
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if path != output_path and old_version.match(name):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # removed by a concurrent request
+                pass
+    return output_path
+
+
+def get_partial_report(db: Session, file: File, ext: str):
+    '''
+    Returns the path of the up to date partial report of a file, generating it when missing
+    '''
+    generate = generate_partial_report_md if ext == "md" else generate_partial_report_json
+    report_name = f"{os.path.splitext(file.filename)[0]}_raport.{ext}"
+    output_path = get_versioned_report_path(
+        get_report_dir(file.job_id), report_name, get_file_report_version(db, file.id)
+    )
+    if not os.path.exists(output_path):
+        store_report(generate, output_path, report_name, db, file.job_id, file.id, file.filename)
+    return output_path
+
+
+def generate_job_reports(db: Session, job_id: int):
+    '''
+    Pre-generates every report of a job for its current content version
+    '''
+    output_dir = get_report_dir(job_id)
+    version = get_job_report_version(db, job_id)
+    for report_name, generate in (
+        ("raport_encoded.csv", generate_main_encoded_raport),
+        ("raport_detailed.csv", generate_main_detailed_raport),
+    ):
+        output_path = get_versioned_report_path(output_dir, report_name, version)
+        if not os.path.exists(output_path):
+            store_report(generate, output_path, report_name, db, job_id)
+
+    for file in db.query(File).filter(File.job_id == job_id).all():
+        get_partial_report(db, file, "md")
+        get_partial_report(db, file, "json")
@@ -1,5 +1,8 @@
+from sqlalchemy import select, insert
 from sqlalchemy.orm import Session
-from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from database.models.job import Job
 from database.models.file import File
 from database.models.question import Question
@@ -9,11 +12,18 @@ from typing import List
 from fastapi import UploadFile
 import os
 import json
+import shutil
+import hashlib
+import aiofiles
 from uuid import uuid4
 from datetime import datetime
-from app.tasks.process_job import process_job
+from app.core.dispatch import enqueue_process_job
+from app.core.events import job_event, answer_event, publish_job_events, format_sse, subscribe_job_events
+from database.database import AsyncSessionLocal
 
 JOB_FILES_DIR = "/app/jobs_files"
+EVENTS_KEEPALIVE_SECONDS = 15
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 
 def get_user_jobs(db: Session, user: User):
@@ -49,11 +59,15 @@ def get_job_detail_demo(db: Session, job_id: int):
     ]
 }
 
-def get_job_detail_by_id(db: Session, user: User, job_id: int):
-    job = db.query(Job).filter(Job.id == job_id, Job.user_id == user.id).first()
+async def get_job_detail_by_id(db: AsyncSession, user: User, job_id: int):
+    job = (await db.execute(select(Job.id, Job.name).where(Job.id == job_id, Job.user_id == user.id))).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    questions = await db.execute(select(Question.id, Question.text).where(Question.job_id == job_id))
+    files = await db.execute(select(File.id, File.filename).where(File.job_id == job_id))
+    answers = await db.execute(select(Answer.id, Answer.question_id, Answer.file_id).where(Answer.job_id == job_id))
+
     return {
         "id": job.id,
         "name": job.name,
@@ -61,28 +75,28 @@ def get_job_detail_by_id(db: Session, user: User, job_id: int):
             {
                 "id": q.id, 
                 "text": q.text
-            } for q in job.questions],
+            } for q in questions],
         "files": [
             {
                 "id": f.id, 
                 "filename": f.filename
-                } for f in job.files],
+                } for f in files],
         "answers": [
             {
                 "id": a.id,
                 "question_id": a.question_id,
                 "file_id": a.file_id
-            } for a in job.answers
+            } for a in answers
         ]
     }
 
-def get_status_job_by_id(db: Session, user: User, job_id: int):
-    job = db.query(Job).filter(Job.id == job_id).first()
+async def get_status_job_by_id(db: AsyncSession, user: User, job_id: int):
+    job = (await db.execute(select(Job.status).where(Job.id == job_id))).first()
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     return {"status": job.status}
 
-def create_job_with_files(db: Session, user: User, name: str, questions: List[str], files: List[UploadFile]):
+def create_job_record(db: Session, user: User, name: str, questions: List[str]):
     job = Job(name=name, user_id=user.id, status="pending")
     db.add(job)
     db.flush()
@@ -94,38 +108,88 @@ def create_job_with_files(db: Session, user: User, name: str, questions: List[st
         db.add(db_question)
         db_questions.append(db_question)
 
-    file_dir = os.path.join(JOB_FILES_DIR, str(job.id), "input")
-    os.makedirs(file_dir, exist_ok=True)
-
-    db_files = []
-    for file in files:
-        filename = file.filename
-        filepath = os.path.join(file_dir, filename)
-        with open(filepath, "wb") as f:
-            f.write(file.file.read())
-        db_file = File(
+    db.flush()
+    return job, db_questions
+
+
+async def save_upload(file: UploadFile, filepath: str) -> str:
+    '''
+    Streams an upload to disk in chunks and returns the sha256 of its content
+    '''
+    digest = hashlib.sha256()
+    async with aiofiles.open(filepath, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            await f.write(chunk)
+    return digest.hexdigest()
+
+
+def add_job_files_and_answers(db: Session, job: Job, db_questions: List[Question], saved_files: List[tuple]):
+    db_files = [
+        File(
             job_id=job.id,
             filename=filename,
             filepath=filepath,
+            content_hash=content_hash,
         )
-        db.add(db_file)
-        db_files.append(db_file)
-
-    db.flush()  
+        for filename, filepath, content_hash in saved_files
+    ]
+    db.add_all(db_files)
+    db.flush()
 
-    for question in db_questions:
-        for db_file in db_files:
-            db_answer = Answer(
-                job_id=job.id,
-                question_id=question.id,
-                file_id=db_file.id,
-                status="pending",
-            )
-            db.add(db_answer)
+    # the whole file x question matrix in a single multi-row insert
+    db.execute(insert(Answer), [
+        {
+            "job_id": job.id,
+            "question_id": question.id,
+            "file_id": db_file.id,
+            "status": "pending",
+        }
+        for question in db_questions
+        for db_file in db_files
+    ])
 
     db.commit()
     db.refresh(job)
-    process_job.delay(job.id)
+    return job
+
+
+def create_job_with_uploads(db: Session, user: User, name: str, questions: List[str], staging_dir: str, uploads: List[tuple]):
+    '''
+    Inserts the job, its questions, files and answers in one short transaction
+    and moves the uploaded files into the job directory
+    '''
+    job, db_questions = create_job_record(db, user, name, questions)
+
+    file_dir = os.path.join(JOB_FILES_DIR, str(job.id), "input")
+    os.makedirs(os.path.dirname(file_dir), exist_ok=True)
+    os.rename(staging_dir, file_dir)
+
+    saved_files = [
+        (filename, os.path.join(file_dir, filename), content_hash)
+        for filename, content_hash in uploads
+    ]
+    return add_job_files_and_answers(db, job, db_questions, saved_files)
+
+
+async def create_job_with_files(db: Session, user: User, name: str, questions: List[str], files: List[UploadFile]):
+    # the uploads are streamed before the job is inserted, so no connection
+    # stays idle in transaction for the whole upload
+    staging_dir = os.path.join(JOB_FILES_DIR, "uploads", uuid4().hex)
+    os.makedirs(staging_dir)
+    try:
+        uploads = []
+        for file in files:
+            filename = os.path.basename(file.filename)
+            content_hash = await save_upload(file, os.path.join(staging_dir, filename))
+            uploads.append((filename, content_hash))
+
+        # database work runs in the threadpool, the event loop only streams the uploads
+        job = await run_in_threadpool(create_job_with_uploads, db, user, name, questions, staging_dir, uploads)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    enqueue_process_job(job.id)
     return job
 
 
@@ -135,5 +199,58 @@ def stop_job_by_id(db: Session, user: User, job_id: int):
         job.status = "error"
         job.finished_at = datetime.utcnow()
         db.commit()
+        publish_job_events(job.id, [job_event(job.status)])
     return job
 
+
+async def check_job_access(db: AsyncSession, user: User, job_id: int):
+    # the demo job is visible to every user
+    user_id = 1 if job_id == 1 else user.id
+    job = (await db.execute(select(Job.id).where(Job.id == job_id, Job.user_id == user_id))).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+async def get_job_events_snapshot(job_id: int):
+    async with AsyncSessionLocal() as db:
+        job = (await db.execute(select(Job.status).where(Job.id == job_id))).first()
+        answers = (await db.execute(
+            select(Answer.id, Answer.status, Answer.answer_encoded).where(Answer.job_id == job_id)
+        )).all()
+    events = [job_event(job.status)] if job else []
+    events += [
+        answer_event(a.id, a.status, a.answer_encoded if a.status == "done" else "")
+        for a in answers
+    ]
+    return events
+
+
+async def stream_job_events(request: Request, job_id: int):
+    '''
+    Server-sent events with the answer status transitions of a job.
+    The current state is sent first, then every change published by the workers.
+    '''
+    client, pubsub = await subscribe_job_events(job_id)
+    try:
+        # subscribe before reading the snapshot, so no transition is lost in between
+        snapshot = await get_job_events_snapshot(job_id)
+        for event in snapshot:
+            yield format_sse(event)
+        # a finished job has nothing more to send
+        if any(event["type"] == "job" and event["status"] in ("done", "error") for event in snapshot):
+            return
+
+        while not await request.is_disconnected():
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=EVENTS_KEEPALIVE_SECONDS)
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = json.loads(message["data"])
+            yield format_sse(event)
+            if event["type"] == "job" and event["status"] in ("done", "error"):
+                break
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
+
@@ -0,0 +1,17 @@
+from app.core.celery_app import celery_app
+from database.database import SessionLocal
+from mies_rag.main import evaluate_job_answers
+from app.tasks.generate_reports import generate_reports
+
+
+@celery_app.task(name="app.tasks.evaluate_answers.evaluate_answers")
+def evaluate_answers(job_id: int):
+    db = SessionLocal()
+    try:
+        evaluated = evaluate_job_answers(db, job_id)
+    finally:
+        db.close()
+    if evaluated:
+        # the reports were built without the evaluation
+        generate_reports.delay(job_id)
+    return f"Evaluated {evaluated} answers of job {job_id}"
@@ -0,0 +1,13 @@
+from app.core.celery_app import celery_app
+from database.database import SessionLocal
+from app.services.file_service import generate_job_reports
+
+
+@celery_app.task(name="app.tasks.generate_reports.generate_reports")
+def generate_reports(job_id: int):
+    db = SessionLocal()
+    try:
+        generate_job_reports(db, job_id)
+    finally:
+        db.close()
+    return f"Generated reports for job {job_id}"
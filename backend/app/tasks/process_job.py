@@ -1,30 +1,221 @@
+from functools import lru_cache
+from datetime import datetime
+from celery import chord
+from celery.signals import worker_process_init
 from app.core.celery_app import celery_app
 from database.database import SessionLocal
-from database.models import Job, Answer, Question
+from database.models import Job, Answer, Question, File
 from mies_rag.main import main as miesRAG
+from mies_rag.main import setup_llm, ingest_file, get_query_engine, answer_question, save_answer
+from mies_rag.utils.QuestionsManager import QuestionsManager
+from mies_rag.utils.embeddings import get_embedding_cache_stats
+from mies_rag.utils.CachedLLM import create_cached_llm
+from mies_rag.config.config import DISTRIBUTED_JOBS, INDEX_CACHE, WORKER_WARM_UP, EVALUATION
+from mies_rag.utils.resources import warm_up, run_async, get_event_loop
+from app.core.events import answer_event, job_event, publish_job_events, record_llm_cache_stats, get_llm_cache_stats
+from app.tasks.generate_reports import generate_reports
+from app.tasks.evaluate_answers import evaluate_answers
 import time
 
 
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    # clients and models are built per process, connection pools must not be shared across the fork
+    get_event_loop()
+    if WORKER_WARM_UP:
+        warm_up()
+        setup_llm()
+
+
 @celery_app.task(name="app.tasks.process_job.process_job")
 def process_job(job_id: int):
     print(f"Processing job {job_id}")
     db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            return f"Job {job_id} not found"
+
+        job.status = "processing"
+        db.commit()
+
+        # answer tasks load the indexes built by the ingest tasks from the index cache,
+        # without it every answer would parse its PDF again
+        if DISTRIBUTED_JOBS and INDEX_CACHE:
+            files = db.query(File).filter(File.job_id == job_id).all()
+            # ingest every file on any free worker, then answer the cells
+            chord(ingest_job_file.si(job_id, f.id) for f in files)(
+                answer_job.si(job_id).on_error(abort_job.si(job_id))
+            )
+            return f"Dispatched job {job_id}"
+
+        questions = db.query(Question).filter(Question.job_id == job_id).all()
+        quesries = []
+        for q in questions:
+            quesries.append(
+                {
+                    "topic": q.text,
+                    "possible_options": q.possible_options
+                }
+            )
+        miesRAG(db, job_id, quesries)
+        finish_job(db, job_id)
+    finally:
+        db.close()
+
+    return f"Processed job {job_id}"
+
+
+@celery_app.task(name="app.tasks.process_job.ingest_job_file")
+def ingest_job_file(job_id: int, file_id: int):
+    db = SessionLocal()
+    try:
+        file = db.query(File).filter(File.id == file_id).first()
+        if not file:
+            return f"File {file_id} not found"
+        try:
+            setup_llm()
+            ingest_file(file.filepath, file.content_hash)
+            print(f"Embedding cache: {get_embedding_cache_stats()}")
+        except Exception as e:
+            # the other files of the job are still answered
+            print(f"Ingesting file {file.filename} failed: {e!r}")
+            db.rollback()
+            failed = db.query(Answer.id).filter(
+                Answer.file_id == file_id,
+                Answer.status == "pending"
+            ).all()
+            db.query(Answer).filter(
+                Answer.id.in_([a.id for a in failed])
+            ).update({"status": "error"}, synchronize_session=False)
+            db.commit()
+            publish_job_events(job_id, [answer_event(a.id, "error") for a in failed])
+            return f"Failed file {file_id}"
+    finally:
+        db.close()
+
+    return f"Ingested file {file_id}"
+
+
+@celery_app.task(name="app.tasks.process_job.answer_job")
+def answer_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job or job.status == "error":
+            return f"Job {job_id} stopped"
+
+        questions = db.query(Question).filter(Question.job_id == job_id).order_by(Question.id).all()
+        queries = [{"topic": q.text, "possible_options": q.possible_options} for q in questions]
+        try:
+            # the research questions are generated once per job and shared by all answer tasks
+            llm = create_cached_llm(setup_llm())
+            questionsManager = QuestionsManager(queries, llm)
+            question_payloads = {q.id: questionsManager.get_question(i) for i, q in enumerate(questions)}
+            record_llm_cache_stats(job_id, llm.get_stats())
+        except Exception as e:
+            # without questions no answer task runs, so finalize_job would never be called
+            print(f"Generating questions of job {job_id} failed: {e!r}")
+            db.rollback()
+            fail_job(db, job_id)
+            return f"Failed job {job_id}"
+
+        answers = db.query(Answer.id, Answer.question_id).filter(
+            Answer.job_id == job_id,
+            Answer.status == "pending"
+        ).all()
+    finally:
+        db.close()
+
+    if not answers:
+        finalize_job.delay(job_id)
+        return f"Nothing to answer for job {job_id}"
+
+    chord(
+        answer_job_question.si(answer_id, question_payloads[question_id])
+        for answer_id, question_id in answers
+    )(finalize_job.si(job_id).on_error(abort_job.si(job_id)))
+    return f"Dispatched {len(answers)} answers for job {job_id}"
+
+
+@lru_cache(maxsize=16)
+def load_query_engine(filepath: str, content_hash: str | None):
+    # answer tasks of the same file often land on the same worker process.
+    # The engine keeps the async clients of the shared LLM and embedding model, which is safe
+    # because every task of the process runs on the same event loop (resources.run_async)
+    return get_query_engine(filepath, content_hash)
+
+
+@celery_app.task(name="app.tasks.process_job.answer_job_question")
+def answer_job_question(answer_id: int, question: dict):
+    db = SessionLocal()
+    try:
+        answer = db.query(Answer).filter(Answer.id == answer_id).first()
+        if not answer or answer.job.status == "error":
+            return f"Answer {answer_id} skipped"
+        job_id = answer.job_id
+        try:
+            llm = create_cached_llm(setup_llm())
+            query_engine = load_query_engine(answer.file.filepath, answer.file.content_hash)
+            respon = run_async(answer_question(llm, question, query_engine))
+            save_answer(db, job_id, answer_id, respon)
+            record_llm_cache_stats(job_id, llm.get_stats())
+        except Exception as e:
+            print(f"Answer {answer_id} failed: {e!r}")
+            db.rollback()
+            db.query(Answer).filter(Answer.id == answer_id).update({"status": "error"}, synchronize_session=False)
+            db.commit()
+            publish_job_events(job_id, [answer_event(answer_id, "error")])
+            return f"Failed answer {answer_id}"
+    finally:
+        db.close()
+
+    return f"Answered {answer_id}"
+
+
+@celery_app.task(name="app.tasks.process_job.finalize_job")
+def finalize_job(job_id: int):
+    db = SessionLocal()
+    try:
+        finish_job(db, job_id)
+    finally:
+        db.close()
+    return f"Processed job {job_id}"
+
+
+@celery_app.task(name="app.tasks.process_job.abort_job")
+def abort_job(job_id: int):
+    # error callback of the job chords, a failed chord never calls its body
+    db = SessionLocal()
+    try:
+        fail_job(db, job_id)
+    finally:
+        db.close()
+    return f"Failed job {job_id}"
+
+
+def fail_job(db, job_id):
     job = db.query(Job).filter(Job.id == job_id).first()
     if not job:
-        return f"Job {job_id} not found"
-
-    job.status = "processing"
-    questions = db.query(Question).filter(Question.job_id == job_id).all()
-    quesries = []
-    for q in questions:
-        quesries.append(
-            {
-                "topic": q.text,
-                "possible_options": q.possible_options
-            }
-        )
-    miesRAG(db, job_id, quesries)
-    job.status = "done"
+        return
+    job.status = "error"
+    job.finished_at = datetime.utcnow()
     db.commit()
+    publish_job_events(job_id, [job_event("error")])
 
-    return f"Processed job {job_id}"
+
+def finish_job(db, job_id):
+    job = db.query(Job).filter(Job.id == job_id).first()
+    # a job stopped by the user keeps its error status
+    if job and job.status != "error":
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+    db.commit()
+    if job:
+        publish_job_events(job_id, [job_event(job.status)])
+        print(f"LLM cache of job {job_id}: {get_llm_cache_stats(job_id)}")
+        # build the downloads in the background so they are instant once the job is finished
+        generate_reports.delay(job_id)
+        if EVALUATION and job.status == "done":
+            # the job is finished already, its answers are scored in the background
+            evaluate_answers.delay(job_id)
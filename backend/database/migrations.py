@@ -0,0 +1,28 @@
+from sqlalchemy import text
+
+# create_all only creates missing tables, changes of existing tables are applied here.
+# Every statement must be idempotent, they are executed on each startup.
+MIGRATIONS = [
+    "ALTER TABLE answers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT (now() AT TIME ZONE 'utc')",
+    "CREATE INDEX IF NOT EXISTS ix_answers_job_id_updated_at ON answers (job_id, updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_answers_file_id_question_id ON answers (file_id, question_id)",
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_answers_job_file_question') THEN
+            ALTER TABLE answers ADD CONSTRAINT uq_answers_job_file_question UNIQUE (job_id, file_id, question_id);
+        END IF;
+    END $$;
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_files_job_id_filename ON files (job_id, filename)",
+    "CREATE INDEX IF NOT EXISTS ix_questions_job_id ON questions (job_id)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_user_id_created_at ON jobs (user_id, created_at)",
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "ALTER TABLE answers ADD COLUMN IF NOT EXISTS evaluation_contexts JSONB",
+]
+
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from database.database import Base
 
 class Answer(Base):
@@ -16,8 +17,15 @@ class Answer(Base):
     answer_contexts = Column(JSONB, default=list)
     answer_conversation = Column(JSONB, default=list)
     evaluation = Column(JSONB, default=dict)
-
+    evaluation_contexts = Column(JSONB(none_as_null=True), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     job = relationship("Job", back_populates="answers")
     file = relationship("File")
     question = relationship("Question")
+
+    __table_args__ = (
+        Index("ix_answers_job_id_updated_at", "job_id", "updated_at"),
+        Index("ix_answers_file_id_question_id", "file_id", "question_id"),
+        UniqueConstraint("job_id", "file_id", "question_id", name="uq_answers_job_file_question"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database.database import Base
@@ -10,6 +10,11 @@ class File(Base):
     job_id = Column(Integer, ForeignKey("jobs.id"))
     filename = Column(String)
     filepath = Column(String)
+    content_hash = Column(String(64), nullable=True)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
-    job = relationship("Job", back_populates="files")
\ No newline at end of file
+    job = relationship("Job", back_populates="files")
+
+    __table_args__ = (
+        Index("ix_files_job_id_filename", "job_id", "filename"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database.database import Base
@@ -16,4 +16,8 @@ class Job(Base):
     user = relationship("User", back_populates="jobs")
     questions = relationship("Question", back_populates="job")
     files = relationship("File", back_populates="job")
-    answers = relationship("Answer", back_populates="job")   
\ No newline at end of file
+    answers = relationship("Answer", back_populates="job")
+
+    __table_args__ = (
+        Index("ix_jobs_user_id_created_at", "user_id", "created_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database.database import Base
@@ -11,4 +11,9 @@ class Question(Base):
     text = Column(Text)
     possible_options = Column(Text, default="")
 
-    job = relationship("Job", back_populates="questions")
\ No newline at end of file
+    job = relationship("Job", back_populates="questions")
+
+    # questions are looked up per job, text is matched in memory (a btree on Text is size limited)
+    __table_args__ = (
+        Index("ix_questions_job_id", "job_id"),
+    )
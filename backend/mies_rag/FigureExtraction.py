@@ -7,6 +7,11 @@ from google import genai
 from google.genai import types
 import re
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from mies_rag.config.config import CAPTION_MODEL, CAPTION_CONCURRENCY, CAPTION_CACHE_DIR, CAPTION_CLIENT
+from mies_rag.utils.cache import sha256_bytes, write_cache_text
+from mies_rag.utils.resources import get_caption_client
 
 gemini_api_key=os.getenv("GEMINI_API_KEY")
 
@@ -23,34 +28,84 @@ def get_figures_and_tables_from_papers(output,full_path):
         scipdf.parse_figures(full_path, output_folder=output)
         print(full_path + " finished")
 
-def analyze_figures_and_tables_with_gemma(folder):
-    client = genai.Client(api_key=gemini_api_key)
-    responses = []
-    for filename in os.listdir(folder):
-        full_path = os.path.join(folder, filename)
-        if os.path.isfile(full_path):
-            with open(full_path, 'rb') as f:
-                image_bytes = f.read()
-
-            response = client.models.generate_content(
-                model='gemma-3-27b-it',
-                contents=[
-                types.Part.from_bytes(
-                    data=image_bytes,
-                    mime_type='image/png',
-                ),
-                'Describe the contents of this image and extract all important information.'
-                ]
-            )
-            if("Figure" in filename):
-                res = "<this is a description of an image> " + response.text + "</this is a description of an image>"
-            elif("Table" in filename):
-                res = "<this is a description of a table>" + response.text + "</this is a description of a table>"
-            print(res)
-            responses.append(res)
-            # name = re.sub('.png','',filename)
-            # with open(os.path.join(output_folder,name)+".txt",'w') as f:
-            #     f.write(response.text)
+class FakeGemmaClient:
+    '''
+    Drop-in replacement of genai.Client returning a fixed description
+    '''
+    class _Response:
+        def __init__(self, text):
+            self.text = text
+
+    def __init__(self, text="Fake description of the image."):
+        self.text = text
+        self.models = self
+
+    def generate_content(self, model, contents):
+        return self._Response(self.text)
+
+
+def create_caption_client():
+    if CAPTION_CLIENT == "fake":
+        return FakeGemmaClient()
+    return genai.Client(api_key=gemini_api_key)
+
+
+def describe_image(client, image_bytes):
+    '''
+    Returns the image description, cached on disk by the hash of the image bytes
+    '''
+    cache_path = os.path.join(CAPTION_CACHE_DIR, CAPTION_MODEL, sha256_bytes(image_bytes) + ".txt")
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    response = client.models.generate_content(
+        model=CAPTION_MODEL,
+        contents=[
+        types.Part.from_bytes(
+            data=image_bytes,
+            mime_type='image/png',
+        ),
+        'Describe the contents of this image and extract all important information.'
+        ]
+    )
+    text = response.text
+
+    # identical images can be described by several threads at once, each writes its own temp file
+    write_cache_text(cache_path, text)
+    return text
+
+
+def analyze_figure_or_table(client, full_path):
+    filename = os.path.basename(full_path)
+    with open(full_path, 'rb') as f:
+        image_bytes = f.read()
+
+    text = describe_image(client, image_bytes)
+    if("Figure" in filename):
+        res = "<this is a description of an image> " + text + "</this is a description of an image>"
+    elif("Table" in filename):
+        res = "<this is a description of a table>" + text + "</this is a description of a table>"
+    else:
+        res = text
+    print(res)
+    return res
+
+
+def analyze_figures_and_tables_with_gemma(folder, client=None):
+    '''
+    Describes every extracted figure and table, CAPTION_CONCURRENCY images at a time
+    '''
+    if not os.path.isdir(folder):
+        return []
+    client = client or get_caption_client()
+    paths = [
+        os.path.join(folder, filename)
+        for filename in sorted(os.listdir(folder))
+        if os.path.isfile(os.path.join(folder, filename))
+    ]
+    with ThreadPoolExecutor(max_workers=CAPTION_CONCURRENCY) as executor:
+        responses = list(executor.map(lambda path: analyze_figure_or_table(client, path), paths))
     return responses
 # get_figures_and_tables_from_papers("outputs","input/12550.pdf")
 # l = analyze_figures_and_tables_with_gemma("outputs/figures")
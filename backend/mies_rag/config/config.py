@@ -1,3 +1,5 @@
+import os
+
 MODEL = "gpt-4o-mini" 
 
 # Maximum number of iterations 
@@ -18,3 +20,115 @@ RAGAS = True
 # Activates Geval for evaluation when EVALUATION is enabled
 G_EVAL = False
 
+# Answers are evaluated in the background once the job is finished,
+# this many answers are scored by a single RAGAS / G-Eval call
+EVALUATION_BATCH_SIZE = 50
+
+# Which answers of a job are evaluated when EVALUATION = True
+# "all" - every answer
+# "fraction" - a random EVALUATION_SAMPLE_FRACTION of the answers
+# "stratified" - EVALUATION_SAMPLES_PER_QUESTION random answers of every question
+EVALUATION_SAMPLING = "all"
+EVALUATION_SAMPLE_FRACTION = 0.2
+EVALUATION_SAMPLES_PER_QUESTION = 3
+
+# Directory with persisted vector indexes, one per PDF content hash
+# Re-submitted papers are loaded from here instead of being parsed again
+INDEX_CACHE_DIR = "/app/jobs_files/index_cache"
+
+# Enable the persistent vector index cache
+INDEX_CACHE = True
+
+# Maximum number of files ingested and answered at the same time
+FILE_CONCURRENCY = 4
+
+# Maximum number of questions answered at the same time for a single file
+# Keeps the number of parallel LLM requests under the provider rate limits
+QUESTION_CONCURRENCY = 5
+
+# Split every job into Celery tasks (ingest per file, answer per cell)
+# so that it can be spread over many workers
+# When disabled, the whole job runs inside a single worker task
+# Requires INDEX_CACHE, the answer tasks load the indexes built by the ingest tasks from it,
+# with INDEX_CACHE = False jobs always run inside a single worker task
+DISTRIBUTED_JOBS = True
+
+# Model used to describe figures and tables
+CAPTION_MODEL = "gemma-3-27b-it"
+
+# Maximum number of figure/table descriptions requested at the same time
+CAPTION_CONCURRENCY = 8
+
+# Directory with cached figure/table descriptions, keyed by image hash
+CAPTION_CACHE_DIR = "/app/jobs_files/caption_cache"
+
+# Client used for figure/table descriptions: "gemini" or "fake"
+# The fake client returns a fixed description without any network calls (local runs, tests)
+CAPTION_CLIENT = "gemini"
+
+# Directory with cached GROBID TEI results, keyed by PDF content hash
+GROBID_CACHE_DIR = "/app/jobs_files/grobid_cache"
+
+# GROBID service used for PDF segmentation
+GROBID_URL = os.getenv("GROBID_URL", "http://grobid:8070")
+
+# Maximum number of documents sent to GROBID at the same time (per process)
+# Should match the GROBID worker count (grobid.concurrency)
+GROBID_CONCURRENCY = 4
+
+# Timeout (seconds) of a single GROBID request
+GROBID_TIMEOUT = 300
+
+# Number of retries when GROBID is busy (503) or unreachable
+GROBID_MAX_RETRIES = 5
+
+# Number of finished answers written to the database in one transaction
+ANSWER_WRITE_BATCH_SIZE = 20
+
+# Maximum time (seconds) a finished answer waits in the write buffer
+ANSWER_WRITE_INTERVAL = 5
+
+# Embedding backend used to index documents and embed queries:
+# "openai" (remote API) or "huggingface" (local model on CPU)
+EMBEDDING_BACKEND = "openai"
+
+# Embedding model of each backend
+OPENAI_EMBEDDING_MODEL = "text-embedding-ada-002"
+HUGGINGFACE_EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+
+# Number of texts embedded in a single batch
+EMBEDDING_BATCH_SIZE = 64
+
+# Number of CPU threads used by the local embedding model
+EMBEDDING_THREADS = 4
+
+# Cache document and query embeddings on disk, shared by all jobs
+# and keyed by the embedding model and the text hash
+EMBEDDING_CACHE = True
+
+# Directory of the embedding cache
+EMBEDDING_CACHE_DIR = "/app/jobs_files/embedding_cache"
+
+# Cache completions of deterministic prompts (question generation, refinement,
+# subquestions, response coding), keyed by model + prompt + parameters
+# When disabled every prompt is sent to the LLM
+LLM_CACHE = True
+
+# Completion cache backend: "disk" (SQLite, shared by the workers through the volume) or "redis"
+LLM_CACHE_BACKEND = "disk"
+
+# Directory of the disk completion cache
+LLM_CACHE_DIR = "/app/jobs_files/llm_cache"
+
+# Redis used by the "redis" completion cache backend (eviction follows the Redis maxmemory policy)
+LLM_CACHE_REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+# Time (seconds) a cached completion stays valid
+LLM_CACHE_TTL = 30 * 24 * 60 * 60
+
+# Maximum number of completions kept by the disk cache, the least recently used are evicted
+LLM_CACHE_MAX_ENTRIES = 100000
+
+# Build the LLM, embedding model, GROBID/caption clients, RAGAS wrappers and spaCy pipeline
+# when a Celery worker process starts instead of on the first task
+WORKER_WARM_UP = True
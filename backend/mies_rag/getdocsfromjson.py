@@ -4,7 +4,7 @@ from jsonpath_ng import jsonpath, parse
 import json
 import openpyxl
 import re
-import spacy
+from mies_rag.utils.resources import get_spacy_pipeline
 
 def get_docs_from_json(file):
     '''
@@ -13,7 +13,7 @@ def get_docs_from_json(file):
     with open(file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     text = data[0]["text"]
-    nlp = spacy.load("en_core_web_sm")
+    nlp = get_spacy_pipeline("en_core_web_sm")
     doc = nlp(text)
     sentences = [sent.text for sent in doc.sents]
     return sentences
\ No newline at end of file
@@ -1,43 +1,68 @@
-import requests
 import os
 from lxml import etree
 
-GROBID_URL = "http://grobid:8070"
-FULLTEXT_ENDPOINT = "/api/processFulltextDocument"
+from mies_rag.config.config import GROBID_CACHE_DIR
+from mies_rag.utils.cache import sha256_file, write_cache_text
+from mies_rag.utils.GrobidClient import get_grobid_client
+
+TEI = '{http://www.tei-c.org/ns/1.0}'
+
+
+def get_tei(filepath):
+    '''
+    Returns the GROBID TEI XML of a PDF.
+    The result is cached on disk by the PDF content hash, so every paper is sent to GROBID only once.
+    '''
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(filepath)
+
+    cache_path = os.path.join(GROBID_CACHE_DIR, sha256_file(filepath) + ".tei.xml")
+    if os.path.isfile(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    tei_xml_string = get_grobid_client().process_fulltext(filepath)
+
+    write_cache_text(cache_path, tei_xml_string)
+    return tei_xml_string
+
+
+def extract_texts_from_tei(tei_xml_string):
+    '''
+    Collects body paragraphs, abstract paragraphs and body section heads in a single walk over the TEI
+    '''
+    root = etree.fromstring(tei_xml_string.encode('utf-8'))
+    paragraphs, abstracts, heads = [], [], []
+
+    for element in root.iter(TEI + 'p', TEI + 'head'):
+        if not element.text:
+            continue
+        in_body = in_front = in_abstract = False
+        for ancestor in element.iterancestors():
+            if ancestor.tag == TEI + 'body':
+                in_body = True
+            elif ancestor.tag == TEI + 'front':
+                in_front = True
+            elif ancestor.tag == TEI + 'div' and ancestor.get('type') == 'abstract':
+                in_abstract = True
+
+        if element.tag == TEI + 'p':
+            if in_body:
+                print(f"AKAPIT {len(paragraphs)+1}: {element.text}")
+                paragraphs.append(element.text)
+            elif in_front and in_abstract:
+                print(f"ABSTRAKT: {element.text.strip()}")
+                abstracts.append(element.text)
+        elif in_body:
+            print(f"SEKCJA: {element.text.strip()}")
+            heads.append(element.text)
+
+    return paragraphs + abstracts + heads
 
 
 def segment_with_grobid(filepath):
     '''
     Uses GROBID to segmentate text into acapits, abstracts, and section heads
-    To use this you NEED to launch grobid in a docker container on localhost:8070.
+    To use this you NEED to launch grobid in a docker container (GROBID_URL in the config).
     '''
-    if os.path.exists(filepath):
-        with open(filepath, 'rb') as pdf_file:
-            files = {'input': pdf_file}
-            response = requests.post(f"{GROBID_URL}{FULLTEXT_ENDPOINT}", files=files)
-        tei_xml_string = response.text
-    
-    root = etree.fromstring(tei_xml_string.encode('utf-8'))
-    ns = {'tei': 'http://www.tei-c.org/ns/1.0'}
-    texts = []
-    
-    paragraphs = root.xpath('//tei:body//tei:p', namespaces=ns)
-    for i, p in enumerate(paragraphs):
-        if p.text:
-            print(f"AKAPIT {i+1}: {p.text}")
-            texts.append(p.text)
-            
-    abstract_paragraphs = root.xpath('//tei:front//tei:div[@type="abstract"]//tei:p', namespaces=ns)
-    for p in abstract_paragraphs:
-        if p.text:
-            print(f"ABSTRAKT: {p.text.strip()}")
-            texts.append(p.text)
-    
-    section_heads = root.xpath('//tei:body//tei:head', namespaces=ns)
-    for head in section_heads:
-        if head.text:
-            print(f"SEKCJA: {head.text.strip()}")
-            texts.append(p.text)
-    
-    return texts
-            
\ No newline at end of file
+    return extract_texts_from_tei(get_tei(filepath))
@@ -1,9 +1,9 @@
 import os
+import math
 import time
+import random
 import asyncio
-import nest_asyncio
 from llama_index.core import Settings
-from llama_index.llms.openai import OpenAI 
 
 from mies_rag.config.config import (
     MODEL, 
@@ -12,15 +12,25 @@ from mies_rag.config.config import (
     EVALUATION, 
     RAGAS,
     G_EVAL,
+    EVALUATION_BATCH_SIZE,
+    EVALUATION_SAMPLING,
+    EVALUATION_SAMPLE_FRACTION,
+    EVALUATION_SAMPLES_PER_QUESTION,
+    FILE_CONCURRENCY,
+    QUESTION_CONCURRENCY,
 )
 
 from mies_rag.utils.QuestionsManager import QuestionsManager
 from mies_rag.utils.VectorQueryEngineCreator import VectorQueryEngineCreator
 from mies_rag.utils.RAGEvaluator import RAGEvaluator
+from mies_rag.utils.AnswerWriter import AnswerWriter, answer_values
+from mies_rag.utils.embeddings import get_embed_model, get_embedding_cache_stats
+from mies_rag.utils.CachedLLM import create_cached_llm
+from mies_rag.utils.resources import get_llm, run_async
 from mies_rag.workflow.MultiStepQueryEngineWorkflow import MultiStepQueryEngineWorkflow
 
-from sqlalchemy import and_
-from database.models import Answer, Question, File
+from database.models import Answer, Question
+from app.core.events import answer_event, publish_job_events
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,12 +38,9 @@ load_dotenv()
 def main(db, job_id, queries):
     INPUT_PATH = os.path.join("/app/jobs_files", str(job_id), "input")
     start = time.time()
-    nest_asyncio.apply()
-    os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-    llm = OpenAI(model=MODEL)
-    Settings.llm = llm
+    llm = create_cached_llm(setup_llm())
     
-    questionsManager = QuestionsManager(queries, Settings.llm)
+    questionsManager = QuestionsManager(queries, llm)
 
     files = os.listdir(INPUT_PATH)
     pdf_files = []
@@ -42,73 +49,193 @@ def main(db, job_id, queries):
         if file.lower().endswith('.pdf'):
             pdf_files.append(os.path.splitext(file)[0])
 
-    for i, file in enumerate(pdf_files):
-        
-        query_engine = VectorQueryEngineCreator(MODEL, INPUT_PATH).get_query_engine(file)
-        workflow = MultiStepQueryEngineWorkflow(timeout=10000)
-        result = asyncio.run(process_file(db, job_id, f"[{i+1}/{len(pdf_files)}]", file, workflow, questionsManager, Settings.llm, query_engine))
-        
+    writer = AnswerWriter(db, job_id)
+    run_async(process_files(writer, INPUT_PATH, pdf_files, questionsManager, llm))
+    writer.flush()
+
     end = time.time()
     execution_time = end - start
     
     print("END")
     print(f"Execution time: {execution_time} seconds")
+    print(f"Embedding cache: {get_embedding_cache_stats()}")
+    print(f"LLM cache: {llm.get_stats()}")
     return 
 
-async def process_file(db, job_id, f, filename, workflow, questionsManager, llm, query_engine):
-    for i in range(questionsManager.count):
-        print(f"\nProcessing: file {f}; query [{i+1}/{questionsManager.count}]")
-        respon = await workflow.run(
-            llm = llm,
-            query = questionsManager.get_question(i),
-            query_engine = query_engine,
-            max_steps = MAX_STEPS,
-            disable_second_loop = DESABLE_SECOND_LOOP,
-        )
-        respon = evaluation(llm, respon)
-        save_in_db(db, job_id, filename, respon)
+def setup_llm():
+    os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
+    llm = get_llm()
+    Settings.llm = llm
+    Settings.embed_model = get_embed_model()
+    return llm
+
+def ingest_file(filepath, content_hash=None):
+    '''
+    Builds (or loads from the index cache) the vector index of a single PDF
+    '''
+    creator = VectorQueryEngineCreator(MODEL, os.path.dirname(filepath))
+    return creator.get_vector_index(filepath, content_hash)
+
+def get_query_engine(filepath, content_hash=None):
+    creator = VectorQueryEngineCreator(MODEL, os.path.dirname(filepath))
+    return creator.get_query_engine(os.path.splitext(os.path.basename(filepath))[0], content_hash)
+
+async def process_files(writer, input_path, pdf_files, questionsManager, llm):
+    semaphore = asyncio.Semaphore(FILE_CONCURRENCY)
+    tasks = [
+        process_file_limited(semaphore, writer, input_path, f"[{i+1}/{len(pdf_files)}]", file, questionsManager, llm)
+        for i, file in enumerate(pdf_files)
+    ]
+    flusher = asyncio.create_task(flush_periodically(writer))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        flusher.cancel()
+
+async def flush_periodically(writer):
+    # answers buffered while no other answer arrives (e.g. during ingestion) are saved anyway
+    while True:
+        await asyncio.sleep(writer.flush_interval)
+        writer.flush_if_due()
+
+async def process_file_limited(semaphore, writer, input_path, f, filename, questionsManager, llm):
+    async with semaphore:
+        try:
+            # ingestion is blocking (GROBID, figure captioning, embeddings), keep it off the event loop
+            query_engine = await asyncio.to_thread(VectorQueryEngineCreator(MODEL, input_path).get_query_engine, filename)
+            await process_file(writer, f, filename, questionsManager, llm, query_engine)
+        except Exception as e:
+            # a broken file must not take down the rest of the job
+            print(f"Processing file {f} {filename} failed: {e!r}")
+            writer.mark_failed(filename)
+
+async def process_file(writer, f, filename, questionsManager, llm, query_engine):
+    semaphore = asyncio.Semaphore(QUESTION_CONCURRENCY)
+    tasks = [
+        asyncio.create_task(process_question(semaphore, f, i, questionsManager, llm, query_engine))
+        for i in range(questionsManager.count)
+    ]
+    try:
+        # save every answer as soon as it is ready instead of waiting for the whole file
+        for task in asyncio.as_completed(tasks):
+            question, respon = await task
+            if respon is None:
+                writer.mark_answer_failed(filename, question["topic"])
+            else:
+                writer.add(filename, respon)
+        writer.flush()
+    finally:
+        # the event loop outlives the task, no workflow may keep running after the file is left
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
     return 1
 
-def evaluation(llm, respon):
-    if EVALUATION:
-        evaluation = RAGEvaluator(llm, respon, MODEL, RAGAS, G_EVAL).evaluate()
-    else:
-        evaluation = {}
+async def process_question(semaphore, f, i, questionsManager, llm, query_engine):
+    async with semaphore:
+        print(f"\nProcessing: file {f}; query [{i+1}/{questionsManager.count}]")
+        question = questionsManager.get_question(i)
+        try:
+            return question, await answer_question(llm, question, query_engine)
+        except Exception as e:
+            # a failing question must not abandon the other questions of the file
+            print(f"Processing: file {f}; query [{i+1}/{questionsManager.count}] failed: {e!r}")
+            return question, None
 
-    if "contexts" in respon:
+async def answer_question(llm, question, query_engine):
+    workflow = MultiStepQueryEngineWorkflow(timeout=10000)
+    respon = await workflow.run(
+        llm = llm,
+        query = question,
+        query_engine = query_engine,
+        max_steps = MAX_STEPS,
+        disable_second_loop = DESABLE_SECOND_LOOP,
+    )
+    # the answer is evaluated later by the evaluation task, keep what it needs
+    if not EVALUATION:
         del respon["contexts"]
-
-    respon["evaluation"] = evaluation
     return respon
-    
-def save_in_db(db, job_id, filename, respon):
-    file = db.query(File).filter(
-        and_(
-            File.filename == f"{filename}.pdf",
-            File.job_id == job_id
-        )
-    ).first()
-
-    question = db.query(Question).filter(
-        and_(
-            Question.text == respon["query"]["topic"],
-            Question.job_id == job_id
-        )
-    ).first()
-
-    existing_answer = db.query(Answer).filter(
-        and_(
-            Answer.file_id == file.id,
-            Answer.question_id == question.id
-        )
-    ).first()
-    if  existing_answer:
-        existing_answer.status = "done"
-        existing_answer.answer_text = respon["answer"]
-        existing_answer.answer_encoded = respon["code"]
-        existing_answer.answer_contexts = respon["best_context"]
-        existing_answer.answer_conversation = respon["reasoning"]
-        existing_answer.evaluation = respon["evaluation"]
 
+def select_evaluation_sample(answers, job_id):
+    '''
+    Picks the answers to evaluate from (answer_id, question_id) pairs according to EVALUATION_SAMPLING.
+    The sample is seeded with the job id, so a retried evaluation picks the same answers.
+    '''
+    rng = random.Random(job_id)
+    if EVALUATION_SAMPLING == "fraction":
+        size = min(len(answers), math.ceil(len(answers) * EVALUATION_SAMPLE_FRACTION))
+        return {answer_id for answer_id, _ in rng.sample(answers, size)}
+    if EVALUATION_SAMPLING == "stratified":
+        by_question = {}
+        for answer_id, question_id in answers:
+            by_question.setdefault(question_id, []).append(answer_id)
+        sample = set()
+        for question_id in sorted(by_question):
+            ids = by_question[question_id]
+            sample.update(rng.sample(ids, min(len(ids), EVALUATION_SAMPLES_PER_QUESTION)))
+        return sample
+    return {answer_id for answer_id, _ in answers}
+
+def drop_unsampled_answers(db, job_id):
+    '''
+    Clears the stored contexts of the answers left out of the evaluation sample.
+    The sample is drawn from all finished answers of the job, which do not change between retries.
+    '''
+    answers = db.query(Answer.id, Answer.question_id).filter(
+        Answer.job_id == job_id,
+        Answer.status == "done"
+    ).order_by(Answer.id).all()
+    sample = select_evaluation_sample([(a.id, a.question_id) for a in answers], job_id)
+    skipped = [a.id for a in answers if a.id not in sample]
+    if skipped:
+        db.query(Answer).filter(
+            Answer.id.in_(skipped),
+            Answer.evaluation_contexts.isnot(None)
+        ).update({"evaluation_contexts": None}, synchronize_session=False)
+        db.commit()
+    print(f"Evaluating {len(sample)} of {len(answers)} answers of job {job_id} ({EVALUATION_SAMPLING})")
+
+def evaluate_job_answers(db, job_id, batch_size=EVALUATION_BATCH_SIZE):
+    '''
+    Evaluates the finished answers of a job waiting for evaluation, batch_size answers per evaluator call
+    '''
+    drop_unsampled_answers(db, job_id)
+    evaluated = 0
+    while True:
+        rows = db.query(Answer, Question).join(Question, Answer.question_id == Question.id).filter(
+            Answer.job_id == job_id,
+            Answer.status == "done",
+            Answer.evaluation_contexts.isnot(None)
+        ).order_by(Answer.id).limit(batch_size).all()
+        if not rows:
+            return evaluated
+
+        respons = [
+            {
+                "query": {"topic": question.text, "possible_options": question.possible_options},
+                "answer": answer.answer_text or "",
+                "code": answer.answer_encoded or "",
+                "contexts": answer.evaluation_contexts,
+            }
+            for answer, question in rows
+        ]
+        evaluations = RAGEvaluator(get_llm(), respons, MODEL, RAGAS, G_EVAL).evaluate()
+        if len(evaluations) != len(rows):
+            # results can't be matched to the answers, the batch is left unevaluated
+            # (its contexts are still cleared, otherwise the same batch would be fetched forever)
+            print(f"Evaluator returned {len(evaluations)} results for {len(rows)} answers of job {job_id}")
+            evaluations = [{}] * len(rows)
+
+        db.bulk_update_mappings(Answer, [
+            {"id": answer.id, "evaluation": evaluation, "evaluation_contexts": None}
+            for (answer, _), evaluation in zip(rows, evaluations)
+        ])
+        db.commit()
+        evaluated += len(rows)
+        print(f"Evaluated {evaluated} answers of job {job_id}")
+    
+def save_answer(db, job_id, answer_id, respon):
+    values = answer_values(respon)
+    db.query(Answer).filter(Answer.id == answer_id).update(values, synchronize_session=False)
     db.commit()
-    return 
+    publish_job_events(job_id, [answer_event(answer_id, values["status"], values["answer_encoded"])])
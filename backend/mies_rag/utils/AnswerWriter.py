@@ -0,0 +1,110 @@
+import os
+import time
+from database.models import Answer, Question, File
+from app.core.events import answer_event, publish_job_events
+
+from mies_rag.config.config import ANSWER_WRITE_BATCH_SIZE, ANSWER_WRITE_INTERVAL
+
+
+def answer_values(respon):
+    return {
+        "status": "done",
+        "answer_text": respon["answer"],
+        "answer_encoded": respon["code"],
+        "answer_contexts": respon["best_context"],
+        "answer_conversation": respon["reasoning"],
+        "evaluation": {},
+        # retrieved contexts wait here for the evaluation task, which clears them
+        "evaluation_contexts": respon.get("contexts"),
+    }
+
+
+class AnswerWriter:
+    '''
+    Buffers finished answers of a job and writes them with bulk updates.
+    Answer ids are resolved once for the whole job, so a write costs no lookups.
+    '''
+    def __init__(self, db, job_id, batch_size=ANSWER_WRITE_BATCH_SIZE, flush_interval=ANSWER_WRITE_INTERVAL):
+        self.db = db
+        self.job_id = job_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.answer_ids = self.load_answer_ids()
+
+    def load_answer_ids(self):
+        rows = self.db.query(Answer.id, File.filename, Question.text).join(
+            File, Answer.file_id == File.id
+        ).join(
+            Question, Answer.question_id == Question.id
+        ).filter(
+            Answer.job_id == self.job_id
+        ).all()
+        return {
+            (os.path.splitext(filename)[0], text): answer_id
+            for answer_id, filename, text in rows
+        }
+
+    def get_file_answer_ids(self, filename):
+        return [answer_id for (name, _), answer_id in self.answer_ids.items() if name == filename]
+
+    def add(self, filename, respon):
+        answer_id = self.answer_ids.get((filename, respon["query"]["topic"]))
+        if answer_id is None:
+            print(f"No answer row for file {filename} and question {respon['query']['topic']!r}")
+            return
+        self.buffer.append({"id": answer_id, **answer_values(respon)})
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        self.db.bulk_update_mappings(Answer, rows)
+        self.db.commit()
+        publish_job_events(self.job_id, [answer_event(row["id"], row["status"], row["answer_encoded"]) for row in rows])
+
+    def mark_answer_failed(self, filename, question_text):
+        '''
+        Marks the answer of a single question of a file as failed
+        '''
+        answer_id = self.answer_ids.get((filename, question_text))
+        if answer_id is None:
+            return
+        updated = self.db.query(Answer).filter(
+            Answer.id == answer_id,
+            Answer.status == "pending"
+        ).update({"status": "error"}, synchronize_session=False)
+        self.db.commit()
+        if updated:
+            publish_job_events(self.job_id, [answer_event(answer_id, "error")])
+
+    def mark_failed(self, filename):
+        '''
+        Marks the pending answers of a file as failed
+        '''
+        self.db.rollback()
+        answer_ids = self.get_file_answer_ids(filename)
+        # answers of the file that are still buffered were answered successfully
+        done_ids = {row["id"] for row in self.buffer}
+        candidate_ids = [answer_id for answer_id in answer_ids if answer_id not in done_ids]
+        # answers flushed already are done, only the pending ones fail
+        failed_ids = [a.id for a in self.db.query(Answer.id).filter(
+            Answer.id.in_(candidate_ids),
+            Answer.status == "pending"
+        ).all()] if candidate_ids else []
+        if failed_ids:
+            self.db.query(Answer).filter(
+                Answer.id.in_(failed_ids)
+            ).update({"status": "error"}, synchronize_session=False)
+        self.db.commit()
+        publish_job_events(self.job_id, [answer_event(answer_id, "error") for answer_id in failed_ids])
@@ -0,0 +1,68 @@
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from mies_rag.utils.cache import sha256_text
+
+
+class CachedEmbedding(BaseEmbedding):
+    '''
+    Wraps an embedding model, document and query embeddings are read from the store
+    when the same text was embedded before by the same model
+    '''
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _store: object = PrivateAttr()
+
+    def __init__(self, embed_model, store, **kwargs):
+        super().__init__(model_name=embed_model.model_name, embed_batch_size=embed_model.embed_batch_size, **kwargs)
+        self._embed_model = embed_model
+        self._store = store
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query):
+        key = sha256_text(query)
+        cached = self._store.get_many([key], kind="query")
+        if key not in cached:
+            cached[key] = self._embed_model.get_query_embedding(query)
+            self._store.put_many(cached, kind="query")
+        return cached[key]
+
+    async def _aget_query_embedding(self, query):
+        key = sha256_text(query)
+        cached = self._store.get_many([key], kind="query")
+        if key not in cached:
+            cached[key] = await self._embed_model.aget_query_embedding(query)
+            self._store.put_many(cached, kind="query")
+        return cached[key]
+
+    def _get_text_embedding(self, text):
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text):
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _split_cached(self, texts):
+        keys = [sha256_text(text) for text in texts]
+        cached = self._store.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        return keys, cached, missing
+
+    def _get_text_embeddings(self, texts):
+        keys, cached, missing = self._split_cached(texts)
+        if missing:
+            vectors = self._embed_model.get_text_embedding_batch(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._store.put_many(new)
+            cached.update(new)
+        return [cached[key] for key in keys]
+
+    async def _aget_text_embeddings(self, texts):
+        keys, cached, missing = self._split_cached(texts)
+        if missing:
+            vectors = await self._embed_model.aget_text_embedding_batch(list(missing.values()))
+            new = dict(zip(missing.keys(), vectors))
+            self._store.put_many(new)
+            cached.update(new)
+        return [cached[key] for key in keys]
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from llama_index.core.base.llms.types import CompletionResponse
+
+from mies_rag.config.config import (
+    LLM_CACHE,
+    LLM_CACHE_BACKEND,
+    LLM_CACHE_DIR,
+    LLM_CACHE_REDIS_URL,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+)
+from mies_rag.utils.cache import sha256_text
+
+EVICTION_INTERVAL = 100
+
+
+class DiskCompletionCache:
+    '''
+    Completions stored in SQLite with TTL expiry and LRU eviction
+    '''
+    def __init__(self, path, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.puts = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_completions_accessed_at ON completions (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM completions WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row:
+                self.conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self.puts += 1
+            if self.puts % EVICTION_INTERVAL == 0:
+                self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        self.conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+        self.conn.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY accessed_at LIMIT max(0, (SELECT COUNT(*) FROM completions) - ?))",
+            (self.max_entries,)
+        )
+
+
+class RedisCompletionCache:
+    '''
+    Completions stored in Redis with TTL, LRU eviction follows the Redis maxmemory policy
+    '''
+    def __init__(self, url=LLM_CACHE_REDIS_URL, ttl=LLM_CACHE_TTL):
+        import redis
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(f"llm_cache:{key}")
+
+    def set(self, key, value):
+        self.client.set(f"llm_cache:{key}", value, ex=self.ttl)
+
+
+class CachedLLM:
+    '''
+    Wraps a LlamaIndex LLM, complete/acomplete answers are served from the cache for prompts seen before.
+    Everything else is delegated to the wrapped LLM.
+    '''
+    def __init__(self, llm, cache, bypass=False):
+        self.llm = llm
+        self.cache = cache
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def cache_key(self, prompt, kwargs):
+        params = {
+            "model": getattr(self.llm, "model", self.llm.metadata.model_name),
+            "temperature": getattr(self.llm, "temperature", None),
+            "max_tokens": getattr(self.llm, "max_tokens", None),
+            "kwargs": kwargs,
+        }
+        return sha256_text(json.dumps({"prompt": prompt, "params": params}, sort_keys=True, default=str))
+
+    def lookup(self, key):
+        try:
+            text = self.cache.get(key)
+        except Exception as e:
+            print(f"LLM cache lookup failed: {e!r}")
+            text = None
+        if text is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return CompletionResponse(text=text)
+
+    def store(self, key, response):
+        try:
+            self.cache.set(key, response.text)
+        except Exception as e:
+            print(f"LLM cache write failed: {e!r}")
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        if self.bypass:
+            return self.llm.complete(prompt, formatted=formatted, **kwargs)
+        key = self.cache_key(prompt, kwargs)
+        response = self.lookup(key)
+        if response is None:
+            response = self.llm.complete(prompt, formatted=formatted, **kwargs)
+            self.store(key, response)
+        return response
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        if self.bypass:
+            return await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+        key = self.cache_key(prompt, kwargs)
+        response = self.lookup(key)
+        if response is None:
+            response = await self.llm.acomplete(prompt, formatted=formatted, **kwargs)
+            self.store(key, response)
+        return response
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if LLM_CACHE_BACKEND == "redis":
+                _cache = RedisCompletionCache()
+            else:
+                _cache = DiskCompletionCache(os.path.join(LLM_CACHE_DIR, "completions.sqlite"))
+        return _cache
+
+
+def create_cached_llm(llm, bypass=not LLM_CACHE):
+    return CachedLLM(llm, None if bypass else get_completion_cache(), bypass=bypass)
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+import threading
+from array import array
+
+
+class EmbeddingStore:
+    '''
+    Content-addressed embedding vectors shared by all jobs, keyed by (model, sha256(text)).
+    Vectors are kept as float32 blobs, WAL mode lets several worker processes share the file.
+    Document and query embeddings are kept apart ("text" and "query" kinds),
+    some models embed queries differently from documents.
+    '''
+    def __init__(self, path, model):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.model = model
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+        self.conn.commit()
+
+    def namespace(self, kind):
+        return self.model if kind == "text" else f"{self.model}#{kind}"
+
+    def get_many(self, keys, kind="text"):
+        keys = list(set(keys))
+        model = self.namespace(kind)
+        result = {}
+        with self.lock:
+            # stay under the SQLite limit of bound parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [model, *chunk]
+                ).fetchall()
+                for key, vector in rows:
+                    result[key] = array('f', vector).tolist()
+            stats = self.stats.setdefault(kind, {"hits": 0, "misses": 0})
+            stats["hits"] += len(result)
+            stats["misses"] += len(keys) - len(result)
+        return result
+
+    def put_many(self, vectors, kind="text"):
+        model = self.namespace(kind)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+                [(model, key, array('f', vector).tobytes()) for key, vector in vectors.items()]
+            )
+            self.conn.commit()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                kind: {
+                    **stats,
+                    "hit_rate": stats["hits"] / (stats["hits"] + stats["misses"]) if stats["hits"] + stats["misses"] else 0.0,
+                }
+                for kind, stats in self.stats.items()
+            }
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from mies_rag.config.config import GROBID_URL, GROBID_CONCURRENCY, GROBID_TIMEOUT, GROBID_MAX_RETRIES
+
+FULLTEXT_ENDPOINT = "/api/processFulltextDocument"
+RETRY_STATUS_CODES = (429, 503)
+
+
+class GrobidClient:
+    '''
+    Shared GROBID client with a keep-alive connection pool.
+    At most `concurrency` documents are processed at the same time and
+    busy responses (503) are retried with exponential backoff.
+    '''
+    def __init__(self, base_url=GROBID_URL, concurrency=GROBID_CONCURRENCY, timeout=GROBID_TIMEOUT,
+                 max_retries=GROBID_MAX_RETRIES, backoff=1.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def retry_delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    def process_fulltext(self, filepath):
+        '''
+        Returns the TEI XML of a PDF
+        '''
+        url = f"{self.base_url}{FULLTEXT_ENDPOINT}"
+        with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with open(filepath, 'rb') as pdf_file:
+                        response = self.session.post(url, files={'input': pdf_file}, timeout=self.timeout)
+                except requests.ConnectionError:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_delay(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        response.raise_for_status()
+                        return response.text
+                    delay = self.retry_delay(attempt, response)
+                print(f"GROBID busy, retrying {filepath} in {delay}s [{attempt+1}/{self.max_retries}]")
+                time.sleep(delay)
+
+    async def aprocess_fulltext(self, filepath):
+        return await asyncio.to_thread(self.process_fulltext, filepath)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_grobid_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GrobidClient()
+        return _client
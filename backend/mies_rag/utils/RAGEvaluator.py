@@ -1,4 +1,5 @@
 import json
+import math
 import os
 from langchain_groq import ChatGroq
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
@@ -24,40 +25,46 @@ from deepeval.metrics import (
 )
 from deepeval.test_case import LLMTestCase
 
+from mies_rag.utils.resources import get_ragas_models
+
 
 class RAGEvaluator:
-    def __init__(self, llm, respon, model, evaluate_ragas, evaluate_geval):
+    '''
+    Evaluates a batch of answers, every metric library is called once for the whole batch
+    '''
+    def __init__(self, llm, respons, model, evaluate_ragas, evaluate_geval):
         self.llm = llm
-        self.respon = respon
+        self.respons = respons
         self.model = model
         self.evaluate_ragas = evaluate_ragas
         self.evaluate_geval = evaluate_geval
         self.samples = self.create_samples()
         
     def create_samples(self):
-        if str(self.respon["query"]["possible_options"]).lower() != "none":
-            a = self.respon["code"]
-        else:
-            a = self.respon["answer"]
-        ragas_sample = SingleTurnSample(
-            user_input = self.respon["query"]["topic"],
-            retrieved_contexts = self.respon["contexts"],
-            response = a,
-            # reference = self.ground_truth[i],
-        )
-        geval_sample = LLMTestCase(
-            input = self.respon["query"]["topic"],
-            actual_output = a,
-            # expected_output = self.ground_truth[i],
-            retrieval_context = self.respon["contexts"],
-        )
-        return {"ragas": [ragas_sample], "geval": [geval_sample]}
+        samples = {"ragas": [], "geval": []}
+        for respon in self.respons:
+            if str(respon["query"]["possible_options"]).lower() != "none":
+                a = respon["code"]
+            else:
+                a = respon["answer"]
+            samples["ragas"].append(SingleTurnSample(
+                user_input = respon["query"]["topic"],
+                retrieved_contexts = respon["contexts"],
+                response = a,
+                # reference = self.ground_truth[i],
+            ))
+            samples["geval"].append(LLMTestCase(
+                input = respon["query"]["topic"],
+                actual_output = a,
+                # expected_output = self.ground_truth[i],
+                retrieval_context = respon["contexts"],
+            ))
+        return samples
 
     def RAGAS(self):
         print("\nRAGAS evaluation")
         dataset = RagasEvaluationDataset(samples=self.samples["ragas"])
-        evaluator_llm = LangchainLLMWrapper(ChatOpenAI(model=self.model))
-        evaluator_embeddings = LangchainEmbeddingsWrapper(OpenAIEmbeddings())
+        evaluator_llm, evaluator_embeddings = get_ragas_models(self.model)
         
         metrics = [
             Faithfulness(llm=evaluator_llm),
@@ -68,8 +75,9 @@ class RAGEvaluator:
 
         dataframe = result.to_pandas()
         columns_to_include = dataframe.columns[3:] 
+        # failed metrics come back as NaN, which is not valid JSON
         result = [
-            {col: row[col] for col in columns_to_include}
+            {col: None if math.isnan(row[col]) else float(row[col]) for col in columns_to_include}
             for _, row in dataframe.iterrows()
         ]
         # obj = {"samples": result}
@@ -95,6 +103,10 @@ class RAGEvaluator:
         return result
 
     def evaluate(self):
-        geval_result = self.DEEPEVAL() if self.evaluate_geval else [None]
-        ragas_result = self.RAGAS() if self.evaluate_ragas else [None] 
-        return {"ragas": ragas_result[0],"geval": geval_result[0]}
+        '''
+        Returns the evaluation of every answer, in the order of the batch
+        '''
+        count = len(self.respons)
+        geval_result = self.DEEPEVAL() if self.evaluate_geval else [None] * count
+        ragas_result = self.RAGAS() if self.evaluate_ragas else [None] * count
+        return [{"ragas": ragas, "geval": geval} for ragas, geval in zip(ragas_result, geval_result)]
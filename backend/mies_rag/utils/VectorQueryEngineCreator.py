@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 from llama_index.llms.openai import OpenAI 
 from llama_parse import LlamaParse 
 from llama_index.core.node_parser import MarkdownElementNodeParser
@@ -9,6 +11,10 @@ from grobidsegmtest import *
 from FigureExtraction import *
 from llama_index.core.schema import Document
 
+from mies_rag.config.config import INDEX_CACHE, INDEX_CACHE_DIR
+from mies_rag.utils.cache import sha256_file
+from mies_rag.utils.embeddings import get_embedding_model_id
+
 
 class VectorQueryEngineCreator:
     def __init__(self, model, input_path):
@@ -27,8 +33,11 @@ class VectorQueryEngineCreator:
         documents = [Document(text=text) for text in texts_from_grobid]
         # Remove chapters containing references
         documents = [doc for doc in documents if 'references' not in doc.text.lower()]
-        get_figures_and_tables_from_papers("outputs",path_to_pdf)
-        additional_texts = analyze_figures_and_tables_with_gemma("outputs/figures")
+        # private temporary folder per ingest, so parallel ingests (threads, processes
+        # or workers sharing the working directory) never remove each other's figures
+        with tempfile.TemporaryDirectory(prefix="figures_") as figures_output:
+            get_figures_and_tables_from_papers(figures_output, path_to_pdf)
+            additional_texts = analyze_figures_and_tables_with_gemma(os.path.join(figures_output, "figures"))
         additional_docs = [Document(text=text) for text in additional_texts]
         all_docs = documents + additional_docs
         node_parser = MarkdownElementNodeParser(
@@ -57,10 +66,44 @@ class VectorQueryEngineCreator:
         )
         return query_engine
 
-    def get_query_engine(self, file):
-        pdf_path = os.path.join(self.input_path, f"{file}.pdf")
+    def get_index_dir(self, pdf_path, content_hash=None):
+        # vectors of different embedding models are not compatible, each model has its own index
+        return os.path.join(INDEX_CACHE_DIR, content_hash or sha256_file(pdf_path), get_embedding_model_id(), "index")
+
+    def load_vector_index(self, index_dir):
+        storage_context = StorageContext.from_defaults(persist_dir=index_dir)
+        return load_index_from_storage(storage_context)
+
+    def persist_vector_index(self, vector_index, index_dir):
+        '''
+        Persists the index into a temporary directory first and then renames it,
+        so a concurrent ingest of the same paper never sees a half written index
+        '''
+        parent_dir = os.path.dirname(index_dir)
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir)
+        vector_index.storage_context.persist(persist_dir=tmp_dir)
+        try:
+            os.rename(tmp_dir, index_dir)
+        except OSError:
+            # another process already persisted the same paper
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def get_vector_index(self, pdf_path, content_hash=None):
+        index_dir = self.get_index_dir(pdf_path, content_hash) if INDEX_CACHE else None
+        if index_dir and os.path.isdir(index_dir):
+            print(f"Loading cached index for {pdf_path}")
+            return self.load_vector_index(index_dir)
+
         documents, node_parser, nodes = self.parse_pdf_to_nodes(pdf_path)
         vector_index = self.create_vector_index(documents, node_parser, nodes)
-        
+        if index_dir:
+            self.persist_vector_index(vector_index, index_dir)
+        return vector_index
+
+    def get_query_engine(self, file, content_hash=None):
+        pdf_path = os.path.join(self.input_path, f"{file}.pdf")
+        vector_index = self.get_vector_index(pdf_path, content_hash)
+
         query_engine = self.create_vector_query_engine(vector_index)
         return query_engine
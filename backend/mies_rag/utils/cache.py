@@ -0,0 +1,46 @@
+import os
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    '''
+    Returns the sha256 hex digest of a file, read in chunks
+    '''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def write_cache_text(path, text):
+    '''
+    Writes a cache entry atomically through a unique temp file, so threads storing the same entry
+    at once never share a temp file. The entry is best effort, a failed write is only reported.
+    '''
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            # concurrent writers store the same content, the last replace wins
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    except OSError as e:
+        print(f"Writing cache entry {path} failed: {e!r}")
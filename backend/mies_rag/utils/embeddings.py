@@ -0,0 +1,69 @@
+import os
+import re
+import threading
+
+from mies_rag.config.config import (
+    EMBEDDING_BACKEND,
+    OPENAI_EMBEDDING_MODEL,
+    HUGGINGFACE_EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_THREADS,
+    EMBEDDING_CACHE,
+    EMBEDDING_CACHE_DIR,
+)
+
+_embed_model = None
+_embed_model_lock = threading.Lock()
+
+
+def get_embedding_model_id():
+    '''
+    Backend and model name as a path-safe string (cache directories depend on it)
+    '''
+    model = HUGGINGFACE_EMBEDDING_MODEL if EMBEDDING_BACKEND == "huggingface" else OPENAI_EMBEDDING_MODEL
+    return re.sub(r"[^A-Za-z0-9._-]+", "--", f"{EMBEDDING_BACKEND}-{model}")
+
+
+def create_embed_model():
+    if EMBEDDING_BACKEND == "huggingface":
+        import torch
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+        torch.set_num_threads(EMBEDDING_THREADS)
+        embed_model = HuggingFaceEmbedding(
+            model_name=HUGGINGFACE_EMBEDDING_MODEL,
+            embed_batch_size=EMBEDDING_BATCH_SIZE,
+            device="cpu",
+        )
+    else:
+        from llama_index.embeddings.openai import OpenAIEmbedding
+
+        embed_model = OpenAIEmbedding(model=OPENAI_EMBEDDING_MODEL, embed_batch_size=EMBEDDING_BATCH_SIZE)
+
+    if EMBEDDING_CACHE:
+        from mies_rag.utils.CachedEmbedding import CachedEmbedding
+        from mies_rag.utils.EmbeddingStore import EmbeddingStore
+
+        store = EmbeddingStore(os.path.join(EMBEDDING_CACHE_DIR, "embeddings.sqlite"), get_embedding_model_id())
+        embed_model = CachedEmbedding(embed_model, store)
+    return embed_model
+
+
+def get_embedding_cache_stats():
+    '''
+    Hits, misses and hit rate of the embedding cache in this process, per kind ("text", "query")
+    '''
+    if _embed_model is None or not EMBEDDING_CACHE:
+        return {}
+    return _embed_model._store.get_stats()
+
+
+def get_embed_model():
+    '''
+    Embedding model shared by the whole process, the local model is loaded only once
+    '''
+    global _embed_model
+    with _embed_model_lock:
+        if _embed_model is None:
+            _embed_model = create_embed_model()
+        return _embed_model
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from mies_rag.config.config import MODEL
+
+# Clients and models shared by every task of a worker process.
+# They are built on first use, or up front by warm_up() when the Celery worker process starts.
+_resources = {}
+_resources_lock = threading.RLock()
+
+
+def get_resource(name, factory):
+    with _resources_lock:
+        if name not in _resources:
+            _resources[name] = factory()
+        return _resources[name]
+
+
+def get_event_loop():
+    '''
+    Event loop of the process. The shared LLM and embedding model keep their async HTTP clients,
+    which are bound to the loop they first ran on, so every task of the process runs on this one.
+    '''
+    def factory():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        return loop
+    return get_resource("event_loop", factory)
+
+
+def run_async(coro):
+    return get_event_loop().run_until_complete(coro)
+
+
+def get_llm():
+    '''
+    OpenAI LLM of the pipeline, its HTTP connection pool is reused by all tasks
+    '''
+    def factory():
+        from llama_index.llms.openai import OpenAI
+        return OpenAI(model=MODEL)
+    return get_resource("llm", factory)
+
+
+def get_caption_client():
+    def factory():
+        from mies_rag.FigureExtraction import create_caption_client
+        return create_caption_client()
+    return get_resource("caption_client", factory)
+
+
+def get_ragas_models(model=MODEL):
+    '''
+    LLM and embeddings wrappers used by the RAGAS metrics
+    '''
+    def factory():
+        from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+        from ragas.llms import LangchainLLMWrapper
+        from ragas.embeddings import LangchainEmbeddingsWrapper
+        return LangchainLLMWrapper(ChatOpenAI(model=model)), LangchainEmbeddingsWrapper(OpenAIEmbeddings())
+    return get_resource(f"ragas:{model}", factory)
+
+
+def get_spacy_pipeline(name="en_core_web_sm"):
+    def factory():
+        import spacy
+        return spacy.load(name)
+    return get_resource(f"spacy:{name}", factory)
+
+
+def warm_up():
+    '''
+    Builds every shared resource, a failing one is only reported and retried on first use
+    '''
+    from mies_rag.utils.embeddings import get_embed_model
+    from mies_rag.utils.GrobidClient import get_grobid_client
+
+    loaders = {
+        "event_loop": get_event_loop,
+        "llm": get_llm,
+        "embed_model": get_embed_model,
+        "grobid_client": get_grobid_client,
+        "caption_client": get_caption_client,
+        "ragas_models": get_ragas_models,
+        "spacy": get_spacy_pipeline,
+    }
+    for name, loader in loaders.items():
+        try:
+            loader()
+        except Exception as e:
+            print(f"Warming up {name} failed: {e!r}")
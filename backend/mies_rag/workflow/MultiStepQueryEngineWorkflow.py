@@ -17,7 +17,7 @@ from mies_rag.workflow.Events.SynthesizeEvent import SynthesizeEvent
 from mies_rag.workflow.Events.CodingEvent import CodingEvent
 
 class MultiStepQueryEngineWorkflow(Workflow):
-    def refine_question(self, llm, query, question, reasoning) -> str:
+    async def refine_question(self, llm, query, question, reasoning) -> str:
         reasons = "\n\t".join([f"{i}. {r['answer'].strip()}" for i, r in enumerate(reasoning)])
         prompt = f"""
             Your task is to reformulate a given question to better reflect the collected information while staying aligned with the main topic. The original question was crafted based on global information about the topic and should retain its core essence but become more precise and tailored to the new data.
@@ -38,7 +38,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
 
         """
 
-        new_query = llm.complete(prompt)
+        new_query = await llm.acomplete(prompt)
         
         return f"{new_query!s}"
 
@@ -90,7 +90,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
         # disable second loop [config option] (without subquestions)
         elif ctx.data["disable_second_loop"]:
             ctx.data["cur_steps"] += 1
-            new_question = self.refine_question(ctx.data["llm"], ctx.data["query"], ctx.data["question"], ctx.data["reasoning"])
+            new_question = await self.refine_question(ctx.data["llm"], ctx.data["query"], ctx.data["question"], ctx.data["reasoning"])
             ctx.data["question"] = new_question
             ctx.data["question_collect_count"] = 1
             return QueryEvent(query = ctx.data["question"])
@@ -98,7 +98,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
             # [LOOP 1] refine question -> new question
             if ctx.data["question_collect_count"] == 3:
                 ctx.data["cur_steps"] += 1
-                new_question = self.refine_question(ctx.data["llm"], ctx.data["query"], ctx.data["question"], ctx.data["reasoning"])
+                new_question = await self.refine_question(ctx.data["llm"], ctx.data["query"], ctx.data["question"], ctx.data["reasoning"])
                 ctx.data["question"] = new_question
                 ctx.data["question_collect_count"] = 1
                 return QueryEvent(query = ctx.data["question"])
@@ -147,7 +147,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
                 ]
             }}
         """
-        subquestions_response = ctx.data["llm"].complete(prompt)
+        subquestions_response = await ctx.data["llm"].acomplete(prompt)
         response_obj = json.loads(str(subquestions_response))
         sub_questions = response_obj["sub_questions"]
 
@@ -156,12 +156,13 @@ class MultiStepQueryEngineWorkflow(Workflow):
             ctx.send_event(QueryEvent(query = q))
         return None
 
-    @step(pass_context=True)
+    # the three subquestions sent by subquestion() are queried at the same time
+    @step(pass_context=True, num_workers=3)
     async def execute_query(self, ctx: Context, ev: QueryEvent) -> AnswerEvent:
 
         ctx.data["question_count"] += 1
         query = QueryBundle(query_str=ev.query)
-        response = ctx.data["query_engine"].query(query)
+        response = await ctx.data["query_engine"].aquery(query)
         return AnswerEvent(
             question = ev.query,
             answer = f"{response!s}",
@@ -202,7 +203,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
                 - If **none** of the options match, respond with exactly: "NO MATCH".
                 - Do not include any extra text or formatting—only matching options or "NO MATCH".
             """
-            code = f"{ctx.data['llm'].complete(prompt)!s}"
+            code = f"{await ctx.data['llm'].acomplete(prompt)!s}"
         else:
             prompt = f"""
                 Your task is to condense the provided text into a maximum of one sentence or phrase that directly addresses the given topic.
@@ -214,7 +215,7 @@ class MultiStepQueryEngineWorkflow(Workflow):
                 - Return the summary as a plain string without any additional formatting or context.
                 - You must always return a meaningful response, even if the input is vague or incomplete.
             """
-            code = f"[response not coded] {ctx.data['llm'].complete(prompt)!s}"
+            code = f"[response not coded] {await ctx.data['llm'].acomplete(prompt)!s}"
 
         best_contexts = sorted(ev.source_nodes, key=lambda c: c.score, reverse=True)[:5]
         result = {
@@ -0,0 +1,45 @@
+'''
+Guards the API cold start: imports the FastAPI app and fails when it takes too long
+or when the ML stack (which belongs to the Celery worker only) got imported with it.
+
+    python scripts/check_api_import.py [max_seconds]
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MAX_IMPORT_SECONDS = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+
+WORKER_ONLY_MODULES = [
+    "mies_rag",
+    "llama_index",
+    "ragas",
+    "deepeval",
+    "langchain",
+    "langchain_openai",
+    "openai",
+    "google.genai",
+    "spacy",
+    "torch",
+]
+
+
+def main():
+    start = time.perf_counter()
+    import app.main  # noqa: F401
+    elapsed = time.perf_counter() - start
+
+    leaked = sorted(name for name in WORKER_ONLY_MODULES if name in sys.modules)
+
+    print(f"Importing app.main took {elapsed:.2f} seconds (limit {MAX_IMPORT_SECONDS:.2f})")
+    if leaked:
+        print(f"Worker only modules imported by the API: {', '.join(leaked)}")
+    if leaked or elapsed > MAX_IMPORT_SECONDS:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()